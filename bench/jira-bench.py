@@ -0,0 +1,613 @@
+#!/usr/bin/python3
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from datetime import timezone
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+# Config
+class config():
+    trackerPath = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+            '..', 'jira-tracker.py')
+    sizes = [1000, 10000, 100000]
+    repeat = 3
+    latency = 0.0               # Delay of each Jira response (s)
+    errors = 0.0                # Ratio of Jira responses "429 Too Many Requests"
+    timeouts = 0.0              # Ratio of Jira responses stalled (timeout)
+    stall = 40.0                # Delay of a stalled response (s)
+    seed = 1
+    sheetRatio = 0.1            # Ratio of tickets with a sheet
+    followRatio = 0.2           # Ratio of tickets with trackstate "Follow"
+    updatedRatio = 0.05         # Ratio of tickets updated on Jira
+    newRatio = 0.01             # Ratio of tickets missing in the database
+    commentRatio = 0.3          # Ratio of rows with a multi-line comment
+    # Startup time: "show --ids" of one key on a small database
+    startupSize = 100
+    startupBudget = 0.3         # Max time (s), the benchmark fails above
+    commands = [
+            "startup",
+            "update",
+            "update-force",
+            "update-news",
+            "show",
+            "show-filter",
+            "modify",
+            "edit",
+            "mail",
+            "search",
+            ]
+
+def debug(strDebug):
+    print(strDebug, file=sys.stderr)
+
+def parseArgs():
+    parser = argparse.ArgumentParser(
+            description="Benchmark of jira-tracker.py commands on synthetic "
+            + "databases against a local fake Jira server")
+    parser.add_argument("-o", "--outFile",
+            help="JSON result file (default: stdout)")
+    parser.add_argument("-s", "--sizes",
+            help="Number of rows of the databases (default: %s)"
+            % ','.join(str(s) for s in config.sizes))
+    parser.add_argument("-c", "--commands",
+            help="Commands to run (default: %s)" % ','.join(config.commands))
+    parser.add_argument("-r", "--repeat", type=int, default=config.repeat,
+            help="Number of runs of each command")
+    parser.add_argument("-l", "--latency", type=float, default=config.latency,
+            help="Delay of each Jira response in seconds")
+    parser.add_argument("-e", "--errors", type=float, default=config.errors,
+            help="Ratio of Jira responses failing with HTTP 429")
+    parser.add_argument("-t", "--timeouts", type=float,
+            default=config.timeouts,
+            help="Ratio of Jira responses stalled beyond the request timeout")
+    parser.add_argument("--compare",
+            help="Previous JSON result file to compare with")
+    parser.add_argument("--tracker", default=config.trackerPath,
+            help="Path of jira-tracker.py")
+    parser.add_argument("--keep", action='store_true',
+            help="Keep the generated databases")
+    parser.add_argument("-b", "--budget", type=float,
+            default=config.startupBudget,
+            help="Max startup time in seconds (command startup)")
+
+    return parser.parse_args()
+
+def jiraDate(date):
+    return date.strftime('%Y-%m-%dT%H:%M:%S.000+0000')
+
+def csvDate(date):
+    return date.strftime('%Y-%m-%d %H:%M')
+
+class fakeJira():
+    # Minimal Jira REST server: serverInfo, issue and search with the JQL
+    # requests of jira-tracker.py
+    _keyRe = re.compile(r'key\s*=\s*"?([A-Z]+-\d+)"?')
+    _keyInRe = re.compile(r'key\s+in\s*\(([^)]*)\)')
+    _projectInRe = re.compile(r'project\s+in\s*\(([^)]*)\)')
+    _dateRe = re.compile(r'(updated|created)\s*(>=|>)\s*"([^"]+)"')
+    _orderRe = re.compile(r'ORDER BY.*$', re.I)
+    issues = None
+    stats = None
+    latency = 0.0
+    errors = 0.0
+    timeouts = 0.0
+    stall = 0.0
+    retryAfter = 1
+    _server = None
+    _lock = None
+
+    def __init__(self, issues, latency=0.0, errors=0.0, seed=1,
+            timeouts=0.0, stall=config.stall):
+        self.issues = issues
+        self.latency = latency
+        self.errors = errors
+        self.timeouts = timeouts
+        self.stall = stall
+        self.stats = dict()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        # Parsed dates used by the JQL filters
+        self._dates = {key: {f: datetime.strptime(issue['fields'][f],
+                '%Y-%m-%dT%H:%M:%S.%f%z') for f in ['created', 'updated']}
+                for key, issue in issues.items()}
+
+    def start(self):
+        handler = type('fakeJiraHandler', (fakeJiraHandler,), {'jira': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever,
+                daemon=True).start()
+        return 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def resetStats(self):
+        with self._lock:
+            stats = self.stats
+            self.stats = dict()
+        return stats
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def isError(self):
+        with self._lock:
+            return self._random.random() < self.errors
+
+    def isTimeout(self):
+        with self._lock:
+            return self._random.random() < self.timeouts
+
+    def search(self, jql):
+        jql = self._orderRe.sub('', jql)
+        keys = None
+        for search in self._keyRe.finditer(jql):
+            keys = set([search.group(1)])
+        for search in self._keyInRe.finditer(jql):
+            keys = set(k.strip().strip('"') for k in search.group(1).split(','))
+        if keys == None:
+            keys = self.issues.keys()
+
+        projects = None
+        for search in self._projectInRe.finditer(jql):
+            projects = set(p.strip().strip('"')
+                    for p in search.group(1).split(','))
+
+        dateConds = list()
+        for search in self._dateRe.finditer(jql):
+            date = datetime.strptime(search.group(3), '%Y-%m-%d %H:%M'
+                    ).replace(tzinfo=timezone.utc)
+            dateConds.append((search.group(1), search.group(2), date))
+
+        ret = list()
+        for key in keys:
+            if not key in self.issues:
+                continue
+            if projects != None and not key.split('-')[0] in projects:
+                continue
+            dates = self._dates[key]
+            if all((dates[f] > d) if op == '>' else (dates[f] >= d)
+                    for f, op, d in dateConds):
+                ret.append(self.issues[key])
+
+        if 'created' in jql:
+            ret.sort(key=lambda i: i['fields']['created'], reverse=True)
+        return ret
+
+    def project(issue, fields):
+        ret = {'id': issue['id'], 'key': issue['key'],
+                'self': issue['self'], 'fields': dict()}
+        for f in fields:
+            if f in issue['fields']:
+                ret['fields'][f] = issue['fields'][f]
+        return ret
+
+class fakeJiraHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    jira = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, obj, headers=list()):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        jira = self.jira
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if jira.latency > 0:
+            time.sleep(jira.latency)
+
+        if url.path.endswith('/serverInfo'):
+            jira.count('serverInfo')
+            return self._send(200, {'versionNumbers': [8, 5, 0],
+                'deploymentType': 'Server',
+                'serverTime': jiraDate(datetime.now(timezone.utc))})
+        if url.path.endswith('/field'):
+            jira.count('field')
+            return self._send(200, [{'id': f, 'clauseNames': [f]} for f in
+                ['summary', 'status', 'resolution', 'created', 'updated']])
+
+        if jira.isError():
+            jira.count('error')
+            return self._send(429, {'errorMessages': ['Rate limit exceeded']},
+                    [('Retry-After', str(jira.retryAfter))])
+        if jira.isTimeout():
+            # The client gives up before the response
+            jira.count('timeout')
+            time.sleep(jira.stall)
+
+        fields = ','.join(query.get('fields', [''])).split(',')
+        if url.path.endswith('/search'):
+            jira.count('search')
+            issues = jira.search(query.get('jql', [''])[0])
+            startAt = int(query.get('startAt', ['0'])[0])
+            maxResults = int(query.get('maxResults', ['50'])[0])
+            return self._send(200, {'startAt': startAt,
+                'maxResults': maxResults, 'total': len(issues),
+                'issues': [fakeJira.project(i, fields)
+                    for i in issues[startAt:startAt + maxResults]]})
+
+        search = re.search(r'/issue/([A-Z]+-\d+)$', url.path)
+        if search:
+            jira.count('issue')
+            if not search.group(1) in jira.issues:
+                return self._send(404, {'errorMessages':
+                    ['Issue does not exist']})
+            return self._send(200, fakeJira.project(
+                jira.issues[search.group(1)], fields))
+
+        jira.count('unknown')
+        self._send(404, {'errorMessages': ['Unknown path']})
+
+class dataSet():
+    # Synthetic database, sheets and Jira issues
+    _words = ['ldlm_cancel', 'osc_lock', 'lock', 'timeout', 'evict', 'client',
+            'server', 'mds', 'ost', 'llite', 'crash', 'LBUG', 'recovery',
+            'lnet', 'ptlrpc', 'quota', 'hsm', 'changelog', 'striping', 'dne']
+    size = 0
+    issues = None
+    rows = None
+    fields = ['key', 'summary', 'status', 'resolution', 'created', 'updated',
+            'interest', 'trackstate', 'jiraurl', 'comment']
+
+    def __init__(self, size, seed=1):
+        self.size = size
+        self._random = random.Random(seed)
+        self.issues = dict()
+        self.rows = list()
+        self._generate()
+
+    def _text(self, nbr):
+        return ' '.join(self._random.choice(self._words) for i in range(nbr))
+
+    def _generate(self):
+        rnd = self._random
+        now = datetime(2020, 6, 6, tzinfo=timezone.utc)
+        newNbr = int(self.size * config.newRatio)
+        for i in range(1, self.size + newNbr + 1):
+            key = 'LU-%d' % i
+            isNew = i > self.size
+            created = now - timedelta(days=rnd.randint(30, 900),
+                    minutes=rnd.randint(0, 1000))
+            if isNew:
+                created = now - timedelta(minutes=rnd.randint(0, 1000))
+            updated = created + timedelta(days=rnd.randint(0, 20),
+                    minutes=rnd.randint(0, 1000))
+            status = rnd.choice(['Open', 'Resolved', 'Reopened', 'In Progress'])
+            self.issues[key] = {
+                    'id': str(10000 + i),
+                    'key': key,
+                    'self': 'http://127.0.0.1/rest/api/2/issue/%d' % (10000 + i),
+                    'fields': {
+                        'summary': self._text(6),
+                        'status': {'self': 'http://127.0.0.1/status/1',
+                            'id': '1', 'name': status},
+                        'resolution': None,
+                        'created': jiraDate(created),
+                        'updated': jiraDate(updated),
+                        },
+                    }
+            if isNew:
+                continue
+
+            trackstate = 'Follow'
+            if rnd.random() >= config.followRatio:
+                trackstate = rnd.choice(['New', 'Close', 'Updated'])
+            comment = ''
+            if rnd.random() < config.commentRatio:
+                comment = '%s\n%s, "%s"' % (self._text(5), self._text(8),
+                        self._text(2))
+            self.rows.append({
+                'key': key,
+                'summary': self.issues[key]['fields']['summary'],
+                'status': status,
+                'resolution': '',
+                'created': csvDate(created),
+                'updated': csvDate(updated),
+                'interest': str(rnd.randint(0, 3)),
+                'trackstate': trackstate,
+                'jiraurl': 'https://jira.whamcloud.com/browse/' + key,
+                'comment': comment,
+                })
+
+            # Modified on Jira since the last synchronization
+            if rnd.random() < config.updatedRatio:
+                self.issues[key]['fields']['updated'] = jiraDate(
+                        updated + timedelta(days=1))
+                self.issues[key]['fields']['status']['name'] = 'Reopened'
+
+    def write(self, dirName):
+        dbPath = os.path.join(dirName, 'db.csv')
+        with open(dbPath, 'w') as fd:
+            csvOut = csv.DictWriter(fd, self.fields,
+                    quoting=csv.QUOTE_NONNUMERIC)
+            csvOut.writeheader()
+            for row in self.rows:
+                csvOut.writerow(row)
+
+        sheetDir = os.path.join(dirName, 'sheets')
+        os.mkdir(sheetDir)
+        rnd = random.Random(self.size)
+        for row in self.rows:
+            if rnd.random() >= config.sheetRatio:
+                continue
+            with open(os.path.join(sheetDir, row['key'] + '.md'), 'w') as fd:
+                fd.write("# %s : %s #\n\n" % (row['key'], row['summary']))
+                fd.write("## Jiraurl ##\n%s\n\n" % row['jiraurl'])
+                fd.write("## Interest ##\n%s\n\n" % row['interest'])
+                fd.write("## Comment ##\n%s\n\n" % self._text(10))
+                fd.write("## Risk ##\n%s\n\n" % self._text(3))
+                fd.write("## Fix ##\n%s\n\n" % self._text(3))
+                fd.write("## Analysis ##\n%s\n%s\n\n" % (self._text(12),
+                    self._text(12)))
+                fd.write("## Calltrace ##\n%s\n"
+                        % '\n'.join(rnd.choice(self._words) + '+0x%x' % i
+                            for i in range(8)))
+        return dbPath
+
+    def sheetKeys(self, dirName):
+        return sorted(name[:-3] for name in os.listdir(
+            os.path.join(dirName, 'sheets')) if name.endswith('.md'))
+
+class benchRunner():
+    # Commands are run in a new interpreter, with the Jira URL of the
+    # configuration replaced by the fake server URL
+    _bootstrap = '\n'.join([
+            "import importlib.util, sys",
+            "path, url = sys.argv[1], sys.argv[2]",
+            "spec = importlib.util.spec_from_file_location('jira_tracker', path)",
+            "mod = importlib.util.module_from_spec(spec)",
+            "spec.loader.exec_module(mod)",
+            "mod.config.jiraURLRoot = url",
+            "mod.conf = mod.config()",
+            "sys.argv = [path] + sys.argv[3:]",
+            "act = mod.action(mod.conf)",
+            "sys.exit(0 if act.runAction(mod.parseArgs()) else 1)",
+            ])
+    _tracker = None
+    _url = None
+    _jira = None
+    _dirName = None
+    _pristine = None
+
+    def __init__(self, tracker, url, jira, dirName):
+        self._tracker = os.path.abspath(tracker)
+        self._url = url
+        self._jira = jira
+        self._dirName = dirName
+        # Copy of the initial database restored before modifying commands
+        self._pristine = os.path.join(dirName, 'pristine')
+        os.mkdir(self._pristine)
+        shutil.copy(os.path.join(dirName, 'db.csv'), self._pristine)
+
+    def reset(self):
+        for name in os.listdir(self._dirName):
+            path = os.path.join(self._dirName, name)
+            if name.startswith('db.csv') or name == '.jira-cache.json':
+                os.unlink(path)
+        shutil.copy(os.path.join(self._pristine, 'db.csv'), self._dirName)
+
+    def run(self, argv, stdin=None, reset=False, repeat=1):
+        runs = list()
+        ret = {'runs': runs, 'status': 'ok', 'requests': dict()}
+        env = dict(os.environ)
+        env['EDITOR'] = 'true'
+        for i in range(repeat):
+            if reset:
+                self.reset()
+            self._jira.resetStats()
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, '-c', self._bootstrap,
+                self._tracker, self._url] + argv, cwd=self._dirName, env=env,
+                input=stdin, stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE, universal_newlines=True)
+            runs.append(round(time.perf_counter() - start, 4))
+            ret['requests'] = self._jira.resetStats()
+            if proc.returncode != 0:
+                ret['status'] = 'failed'
+                ret['error'] = proc.stderr.strip().split('\n')[-1]
+                break
+
+        ret['min'] = min(runs)
+        ret['median'] = round(statistics.median(runs), 4)
+        return ret
+
+class benchmark():
+    _args = None
+    results = None
+
+    def __init__(self, args):
+        self._args = args
+        self.results = list()
+
+    def run(self):
+        sizes = config.sizes
+        if self._args.sizes:
+            sizes = [int(s) for s in self._args.sizes.split(',')]
+        commands = config.commands
+        if self._args.commands:
+            commands = self._args.commands.split(',')
+            for command in commands:
+                if not command in config.commands:
+                    debug("Unknown command: %s" % command)
+                    return False
+
+        # Startup is measured once, on a small database
+        if 'startup' in commands:
+            commands = [c for c in commands if c != 'startup']
+            if not self._runSize(config.startupSize, ['startup']):
+                return False
+
+        for size in sizes:
+            if len(commands) > 0 and not self._runSize(size, commands):
+                return False
+        return True
+
+    def isOverBudget(self):
+        return any(r['status'] == 'over budget' for r in self.results)
+
+    def _runSize(self, size, commands):
+        debug("Generate a database of %d rows" % size)
+        data = dataSet(size, config.seed)
+        dirName = tempfile.mkdtemp(prefix='jira-bench-%d.' % size)
+        try:
+            data.write(dirName)
+            jira = fakeJira(data.issues, self._args.latency, self._args.errors,
+                    config.seed, self._args.timeouts)
+            url = jira.start()
+            try:
+                runner = benchRunner(self._args.tracker, url, jira, dirName)
+                sheetKeys = data.sheetKeys(dirName)
+                for command in commands:
+                    debug("%d rows: %s" % (size, command))
+                    result = self._runCommand(runner, command, data,
+                            sheetKeys)
+                    result.update({'size': size, 'command': command})
+                    self.results.append(result)
+                    if result['status'] != 'ok':
+                        debug("%s %s: %s" % (command, result['status'],
+                            result.get('error', '')))
+            finally:
+                jira.stop()
+        finally:
+            if self._args.keep:
+                debug("Databases kept in %s" % dirName)
+            else:
+                shutil.rmtree(dirName)
+        return True
+
+    def _runCommand(self, runner, command, data, sheetKeys):
+        repeat = self._args.repeat
+        rnd = random.Random(config.seed)
+        keys = [row['key'] for row in rnd.sample(data.rows,
+            min(10, len(data.rows)))]
+        sheetKey = sheetKeys[0] if len(sheetKeys) > 0 else keys[0]
+
+        if command == 'startup':
+            result = runner.run(['db.csv', 'show', '-i', keys[0]],
+                    reset=False, repeat=max(repeat, 5))
+            result['budget'] = self._args.budget
+            if result['status'] == 'ok' and result['min'] > self._args.budget:
+                result['status'] = 'over budget'
+            return result
+        if command == 'update':
+            return runner.run(['db.csv', 'update', '--no-news'], reset=True,
+                    repeat=repeat)
+        if command == 'update-force':
+            return runner.run(['db.csv', 'update', '--force', '--no-news'],
+                    reset=True, repeat=repeat)
+        if command == 'update-news':
+            return runner.run(['db.csv', 'update'], reset=True, repeat=repeat)
+        if command == 'show':
+            return runner.run(['db.csv', 'show', '-c', 'trackstate', keys[0]],
+                    reset=False, repeat=repeat)
+        if command == 'show-filter':
+            return runner.run(['db.csv', 'show', '-i', '-f',
+                'trackstate=Follow'], reset=False, repeat=repeat)
+        if command == 'modify':
+            return runner.run(['db.csv', 'modify', '-k', ','.join(keys),
+                'trackstate=Follow'], reset=True, repeat=repeat)
+        if command == 'edit':
+            # Save the sheet, keep the trackstate
+            return runner.run(['db.csv', 'edit', sheetKey], stdin='y\n\n',
+                    reset=True, repeat=repeat)
+        if command == 'mail':
+            return runner.run(['db.csv', 'mail'] + sheetKeys, reset=False,
+                    repeat=repeat)
+        if command == 'search':
+            return runner.run(['db.csv', 'search', 'ldlm_cancel'],
+                    reset=False, repeat=repeat)
+
+    def report(self):
+        return {
+                'date': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'revision': self._revision(),
+                'options': {
+                    'repeat': self._args.repeat,
+                    'latency': self._args.latency,
+                    'errors': self._args.errors,
+                    'timeouts': self._args.timeouts,
+                    'budget': self._args.budget,
+                    },
+                'results': self.results,
+                }
+
+    def _revision(self):
+        try:
+            return subprocess.run(['git', 'describe', '--always', '--dirty'],
+                    cwd=os.path.dirname(os.path.abspath(self._args.tracker)),
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                    universal_newlines=True).stdout.strip() or None
+        except Exception:
+            return None
+
+    def compare(self, path):
+        try:
+            with open(path) as fd:
+                previous = json.load(fd)
+        except Exception as inst:
+            debug("Fail to read %s: %s" % (path, inst))
+            return False
+
+        before = {(r['size'], r['command']): r for r in previous['results']}
+        debug("%8s %-14s %10s %10s %8s" % ('rows', 'command', 'before',
+            'after', 'ratio'))
+        for result in self.results:
+            old = before.get((result['size'], result['command']))
+            if old == None or old['status'] == 'failed':
+                continue
+            ratio = result['min'] / old['min'] if old['min'] > 0 else 0
+            debug("%8d %-14s %9.3fs %9.3fs %7.2fx%s" % (result['size'],
+                result['command'], old['min'], result['min'], ratio,
+                ' slower' if ratio > 1.1 else ''))
+        return True
+
+if __name__ == "__main__":
+    args = parseArgs()
+    bench = benchmark(args)
+    if not bench.run():
+        sys.exit(1)
+
+    report = json.dumps(bench.report(), indent=2)
+    if args.outFile:
+        with open(args.outFile, 'w') as fd:
+            fd.write(report + '\n')
+    else:
+        print(report)
+
+    if args.compare:
+        bench.compare(args.compare)
+
+    if bench.isOverBudget():
+        debug("Startup time over the budget of %.2fs" % args.budget)
+        sys.exit(1)
@@ -6,13 +6,28 @@ import sys
 import os
 import shutil
 import tempfile
+import sqlite3
 import re
+import json
+import hashlib
+import math
+import io
 import urllib.parse
+import threading
+import time
+import random
+import heapq
 from datetime import datetime
 from datetime import timezone
 from datetime import timedelta
 from collections import OrderedDict
-from jira import JIRA
+from collections import deque
+from collections.abc import MutableMapping
+# Imported when needed: the local commands (show, modify, mail...) start
+# without loading the Jira client modules
+# from concurrent.futures import ThreadPoolExecutor, as_completed
+# from jira import JIRA
+# import asyncio, ssl, cProfile, email, http.client
 
 # Config
 class config():
@@ -25,6 +40,10 @@ class config():
             "created",
             "updated"
             ]
+    # Jira fields that can be empty in a synchronized row
+    jiraOptionalFields = [
+            "resolution",
+            ]
     localFields = [
             "interest",
             "trackstate",
@@ -35,6 +54,51 @@ class config():
             "created",
             "updated",
             ]
+    # Number of keys per "key in (...)" JQL request
+    jiraBatchSize = 100
+    # Number of issues per page of Jira search results
+    jiraPageSize = 100
+    # Max number of Jira requests in flight
+    jiraWorkers = 4
+    # Jira client: "jira" (python module) or "asyncio" (REST API)
+    jiraTransport = "jira"
+    # Jira request scheduling
+    jiraTimeout = 30            # Request timeout (s)
+    jiraRate = 10               # Max requests per second
+    jiraBurst = 10              # Max burst of requests
+    jiraRetries = 5             # Retries of a failing request
+    jiraBackoff = 1             # First retry delay (s)
+    jiraMaxBackoff = 120        # Max retry delay (s)
+    jiraBreakerErrors = 5       # Consecutive failures to stop requests
+    jiraBreakerDelay = 60       # Delay before trying again (s)
+    jiraLatency = 5             # Latency above which concurrency decreases (s)
+    # Local cache of Jira responses
+    jiraCacheFile = ".jira-cache.json"
+    jiraCacheTTL = 600          # Max age of a cached response (s)
+    jiraCacheSize = 20000       # Max number of cached issues
+    # Max size of the CSV change journal before it is merged (0: disabled)
+    journalSize = 1024 * 1024
+    # Keep a sidecar index of the CSV rows by key (<csvfile>.idx)
+    keyIndex = True
+    # Number of sheets rendered concurrently by the mail command
+    sheetWorkers = 8
+    # Seconds between the Jira synchronizations of the serve command
+    serveInterval = 3600
+    # Max number of rows sorted in memory by show --sort, more rows are
+    # sorted by runs written in temporary files
+    sortRows = 50000
+    # Columns and sheet fields indexed by the search command
+    searchFields = [
+            "summary",
+            "comment",
+            "status",
+            ]
+    searchSheetFields = [
+            "analysis",
+            "risk",
+            "fix",
+            "calltrace",
+            ]
 
     def mergeFields(self, field2Merge):
         confFields = self.jiraFields + self.localFields
@@ -42,38 +106,114 @@ class config():
                 key=confFields.index)
         return list(field2Merge) + diffList
 
-def debug(strDebug):
-    print(strDebug, file=sys.stderr)
+# Output streams of a command run by the daemon, set in the thread of the
+# command: the other threads keep sys.stdout and sys.stderr
+threadOutput = threading.local()
 
-def parseArgs():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("inFile", type=argparse.FileType('r'),
+def outStream():
+    return getattr(threadOutput, 'stdout', None) or sys.stdout
+
+def errStream():
+    return getattr(threadOutput, 'stderr', None) or sys.stderr
+
+def debug(strDebug):
+    print(strDebug, file=errStream())
+
+class argParser(argparse.ArgumentParser):
+    # Help and errors written to the output streams of the thread
+    def print_help(self, file=None):
+        super().print_help(file or outStream())
+
+    def print_usage(self, file=None):
+        super().print_usage(file or outStream())
+
+    def error(self, message):
+        self.print_usage(errStream())
+        self.exit(2, "%s: error: %s\n" % (self.prog, message))
+
+    def exit(self, status=0, message=None):
+        if message:
+            errStream().write(message)
+        sys.exit(status)
+
+def parseArgs(argv=None, cwd=None):
+    # cwd: directory of the relative paths (commands run by the daemon)
+    def toPath(name):
+        return os.path.join(cwd, name) if cwd else name
+    def toFile(mode):
+        fileType = argparse.FileType(mode)
+        return lambda name: fileType(toPath(name))
+
+    parser = argParser()
+    parser.add_argument("inFile", type=toFile('r'),
             help="CSV database path")
+    parser.add_argument("--stats", action='store_true',
+            help="Display the time of each phase, the Jira requests and "
+            + "the database I/O of the command")
+    parser.add_argument("--stats-file", type=toPath,
+            help="Write the statistics of the command in a JSON file")
+    parser.add_argument("--profile", type=toPath,
+            help="Write a cProfile dump of the command in a file")
+    parser.add_argument("--no-daemon", action='store_true',
+            help="Run the command even if a daemon serves the database")
     subParsers = parser.add_subparsers(dest='action',
             help="Action on CSV database")
 
+    # Serve
+    serveParse = subParsers.add_parser('serve',
+            help="Serve show, modify and search from memory")
+    serveParse.add_argument( "-i", "--interval", type=int,
+            help="Seconds between Jira synchronizations (0: disabled)")
+    serveParse.add_argument( "-n", "--no-news", action='store_true',
+            help="Do not check for new tickets")
+    serveParse.add_argument( "-j", "--jobs", type=int,
+            help="Max number of concurrent Jira requests")
+    serveParse.add_argument( "--offline", action='store_true',
+            help="Use only the local cache of Jira responses")
+    serveParse.add_argument( "--transport", choices=['jira', 'asyncio'],
+            help=argparse.SUPPRESS)
+    serveParse.add_argument( "-w", "--webhook",
+            help="Receive the Jira webhooks on [HOST:]PORT "
+            + "(default host: 127.0.0.1)")
+
     # Update
     updateParse = subParsers.add_parser('update', help="Update Database")
-    updateParse.add_argument( "-o", "--outFile",
+    updateParse.add_argument( "-o", "--outFile", type=toPath,
             help="CSV database out path")
     updateParse.add_argument( "-n", "--no-news", action='store_true',
             help="Do not check for new tickets")
     updateParse.add_argument( "-f", "--force", action='store_true',
             help="Force to update each row of CSV files")
+    updateParse.add_argument( "-j", "--jobs", type=int,
+            help="Max number of concurrent Jira requests")
+    updateParse.add_argument( "--offline", action='store_true',
+            help="Use only the local cache of Jira responses")
+    updateParse.add_argument( "--transport", choices=['jira', 'asyncio'],
+            help=argparse.SUPPRESS)
+    updateParse.add_argument("databases", nargs='*', type=toFile('r'),
+            help="Other databases updated with the same Jira requests")
 
     # Search
     searchParse = subParsers.add_parser('search',
             help="Search in database")
+    searchParse.add_argument( "-d", "--sheetDir", type=toPath,
+            help="Directory where is store ticket sheets")
+    searchParse.add_argument( "-i", "--ids", action='store_true',
+            help="Display only the ticket ids")
+    searchParse.add_argument( "--limit", type=int, default=0,
+            help="Max number of tickets displayed")
     searchParse.add_argument("searchCmd",
-            help="Jira search string")
+            help="Words to search, \"words between quotes\" for a phrase")
 
     # Mail
     mailParse = subParsers.add_parser('mail',
             help="Generate output for a mail")
-    mailParse.add_argument( "-d", "--sheetDir",
+    mailParse.add_argument( "-d", "--sheetDir", type=toPath,
             help="Directory where is store ticket sheets")
-    mailParse.add_argument( "-o", "--outFile", type=argparse.FileType('w'),
+    mailParse.add_argument( "-o", "--outFile", type=toFile('w'),
             help="Mail output file", default=sys.stdout)
+    mailParse.add_argument( "-s", "--sort", default='key',
+            help="Column or sheet field used to sort the sheets (default: key)")
     mailParse.add_argument("keys", nargs='*',
             help="Ticket key of the sheet")
     ##   Filters
@@ -85,14 +225,23 @@ def parseArgs():
             help="Ticket filter. Format: <column>=<patern_val>")
     mailParse.add_argument( "-a", "--filter-and", action='store_true',
             help="Match reunion of filters. By default match union")
+    mailParse.add_argument( "-w", "--where",
+            help="Filter expression, ex: \"status in (Open, Reopened) and "
+            + "updated >= -7d\"")
 
     # Edit sheet
     editParser = subParsers.add_parser('edit',
             help="Edit jira ticket sheet")
-    editParser.add_argument("-d", "--sheetDir",
+    editParser.add_argument("-d", "--sheetDir", type=toPath,
             help="Directory where is store ticket sheets")
     editParser.add_argument("-n", "--no-update", action='store_true',
             help="Do not update sheet with field in csv")
+    editParser.add_argument("-j", "--jobs", type=int,
+            help="Max number of concurrent Jira requests")
+    editParser.add_argument("--offline", action='store_true',
+            help="Use only the local cache of Jira responses")
+    editParser.add_argument("--transport", choices=['jira', 'asyncio'],
+            help=argparse.SUPPRESS)
     editParser.add_argument("keys", nargs='*',
             help="Ticket key of the sheet")
     ##   Filters
@@ -104,6 +253,9 @@ def parseArgs():
             help="Ticket filter. Format: <column>=<patern_val>")
     editParser.add_argument( "-a", "--filter-and", action='store_true',
             help="Match reunion of filters. By default match union")
+    editParser.add_argument( "-w", "--where",
+            help="Filter expression, ex: \"status in (Open, Reopened) and "
+            + "updated >= -7d\"")
 
     # Modify values
     setParser = subParsers.add_parser('modify',
@@ -121,6 +273,15 @@ def parseArgs():
             help="Ticket filter. Format: <column>=<patern_val>")
     setParser.add_argument( "-a", "--filter-and", action='store_true',
             help="Match reunion of filters. By default match union")
+    setParser.add_argument( "-w", "--where",
+            help="Filter expression, ex: \"status in (Open, Reopened) and "
+            + "updated >= -7d\"")
+
+    # Convert
+    convertParser = subParsers.add_parser('convert',
+            help="Copy the database to a CSV or SQLite (.db, .sqlite) file")
+    convertParser.add_argument("outFile", type=toPath,
+            help="Database out path")
 
     # Show
     showParser = subParsers.add_parser('show',
@@ -133,6 +294,13 @@ def parseArgs():
             help="Select colums to display (default all): -c comment,trackstate")
     showParser.add_argument("--csv", action='store_true',
             help="Display lines in csv format")
+    showParser.add_argument( "-s", "--sort",
+            help="Columns used to sort the lines, then the key: "
+            + "-s updated,interest")
+    showParser.add_argument( "-r", "--reverse", action='store_true',
+            help="Sort in descending order")
+    showParser.add_argument( "--limit", type=int, default=0,
+            help="Max number of lines displayed")
     showParser.add_argument("keys", nargs='*',
             help="Ticket key of the sheet")
     ##   Filters
@@ -146,17 +314,163 @@ def parseArgs():
             help="Ticket filter. Format: <column>=<patern_val>")
     showParser.add_argument( "-a", "--filter-and", action='store_true',
             help="Match reunion of filters. By default match union")
+    showParser.add_argument( "-w", "--where",
+            help="Filter expression, ex: \"status in (Open, Reopened) and "
+            + "updated >= -7d\"")
+
+    return parser.parse_args(argv)
+
+class runStats():
+    # Statistics of a command (--stats): wall time of the phases, Jira
+    # requests by type, bytes read and written in the database, rows
+    enabled = False
+    # Upper bounds (s) of the Jira latency histogram
+    latencyBuckets = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+    _lock = threading.Lock()
+    _start = None
+    _end = None
+    _phase = None
+    _phaseStart = None
+    _info = dict()
+    phases = OrderedDict()
+    requests = dict()
+    counters = dict()
+    bytesRead = 0
+    bytesWritten = 0
+
+    def start(**info):
+        runStats.enabled = True
+        runStats._info = info
+        runStats._start = time.monotonic()
+        runStats._end = None
+        runStats._phase = None
+        runStats.phases = OrderedDict()
+        runStats.requests = dict()
+        runStats.counters = dict()
+        runStats.bytesRead = 0
+        runStats.bytesWritten = 0
+
+    def stop(**info):
+        runStats.phase(None)
+        runStats._info.update(info)
+        runStats._end = time.monotonic()
+        runStats.enabled = False
+
+    def phase(name):
+        # End the current phase and start the next one
+        if not runStats.enabled:
+            return
+        now = time.monotonic()
+        if runStats._phase != None:
+            runStats.phases[runStats._phase] = (runStats.phases.get(
+                runStats._phase, 0) + now - runStats._phaseStart)
+        runStats._phase = name
+        runStats._phaseStart = now
+
+    def request(kind, latency, failed=False):
+        if not runStats.enabled:
+            return
+        with runStats._lock:
+            entry = runStats.requests.setdefault(kind,
+                    {'latencies': list(), 'errors': 0})
+            entry['latencies'].append(latency)
+            if failed:
+                entry['errors'] += 1
+
+    def count(name, nbr=1):
+        if not runStats.enabled:
+            return
+        with runStats._lock:
+            runStats.counters[name] = runStats.counters.get(name, 0) + nbr
+
+    def read(nbr):
+        if runStats.enabled:
+            with runStats._lock:
+                runStats.bytesRead += nbr
+
+    def written(nbr):
+        if runStats.enabled:
+            with runStats._lock:
+                runStats.bytesWritten += nbr
+
+    def report():
+        wallTime = (runStats._end or time.monotonic()) - runStats._start
+        rows = runStats.counters.get('rows', 0)
+        ret = OrderedDict(runStats._info)
+        ret['date'] = datetime.now(timezone.utc).isoformat()
+        ret['wallTime'] = round(wallTime, 6)
+        ret['phases'] = OrderedDict((name, round(seconds, 6))
+                for name, seconds in runStats.phases.items())
+        ret['rows'] = rows
+        ret['rowsPerSecond'] = round(rows / wallTime, 1) if wallTime > 0 else 0
+        ret['bytesRead'] = runStats.bytesRead
+        ret['bytesWritten'] = runStats.bytesWritten
+        ret['counters'] = dict(runStats.counters)
+        ret['requests'] = OrderedDict()
+        for kind, entry in sorted(runStats.requests.items()):
+            latencies = sorted(entry['latencies'])
+            histogram = OrderedDict((str(bound), 0)
+                    for bound in runStats.latencyBuckets + ['+Inf'])
+            for latency in latencies:
+                bound = next((b for b in runStats.latencyBuckets
+                    if latency <= b), '+Inf')
+                histogram[str(bound)] += 1
+            ret['requests'][kind] = OrderedDict([
+                ('count', len(latencies)),
+                ('errors', entry['errors']),
+                ('total', round(sum(latencies), 6)),
+                ('min', round(latencies[0], 6)),
+                ('p50', round(latencies[len(latencies) // 2], 6)),
+                ('p95', round(latencies[int(len(latencies) * 0.95)], 6)),
+                ('max', round(latencies[-1], 6)),
+                ('histogram', histogram),
+                ])
+        return ret
 
-    return parser.parse_args()
+    def display(report):
+        debug("\nStatistics of '%s' (%s): %.3fs"
+                % (report.get('command'), report.get('status'),
+                    report['wallTime']))
+        for name, seconds in report['phases'].items():
+            debug("  %-10s %8.3fs" % (name, seconds))
+        debug("  rows: %d (%.1f rows/s)" % (report['rows'],
+            report['rowsPerSecond']))
+        debug("  bytes read: %d, written: %d" % (report['bytesRead'],
+            report['bytesWritten']))
+        for name, value in sorted(report['counters'].items()):
+            if name != 'rows':
+                debug("  %s: %d" % (name, value))
+        for kind, entry in report['requests'].items():
+            debug("  Jira %s: %d requests, %d errors, %.3fs, "
+                    % (kind, entry['count'], entry['errors'], entry['total'])
+                    + "latency min/p50/p95/max: %.3f/%.3f/%.3f/%.3fs"
+                    % (entry['min'], entry['p50'], entry['p95'], entry['max']))
+            debug("    " + ' '.join("<=%s:%d" % (bound, nbr)
+                for bound, nbr in entry['histogram'].items() if nbr > 0))
+
+    def save(report, path):
+        try:
+            with open(path, 'w') as fd:
+                json.dump(report, fd, indent=2)
+                fd.write('\n')
+        except Exception as inst:
+            debug("Fail to write statistics in %s: %s" % (path, inst))
+            return False
+        return True
 
 class dateCSV():
     strCsvFormat = '%Y-%m-%d %H:%M'
     date = None
+    _str = None
 
-    def __init__(self, date):
+    def __init__(self, date, dateStr=None):
+        # dateStr: date already formatted with strCsvFormat
         self.date = date
+        self._str = dateStr
 
     def __str__(self):
+        if self._str != None:
+            return self._str
         return self.date.strftime(self.strCsvFormat)
 
     def fromJira(str2Conv):
@@ -168,113 +482,1332 @@ class dateCSV():
             return str2Conv
 
     def fromCsv(str2Conv):
+        # The same dates are found in many rows: conversions are memoized
+        date = dateCSV._csvDates.get(str2Conv)
+        if date == None:
+            date = dateCSV._parseCsv(str2Conv)
+            if len(dateCSV._csvDates) >= 100000:
+                dateCSV._csvDates.clear()
+            dateCSV._csvDates[str2Conv] = date
+
+        if date == False:
+            return str2Conv
+        return dateCSV(date[0], date[1])
+
+    # CSV string -> (datetime, CSV string if well formatted), False if invalid
+    _csvDates = dict()
+
+    def _parseCsv(str2Conv):
+        # Fast path for strCsvFormat: "YYYY-MM-DD HH:MM"
+        s = str2Conv
+        if (len(s) == 16 and s[4] == '-' and s[7] == '-' and s[10] == ' '
+                and s[13] == ':'):
+            try:
+                return (datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                        int(s[11:13]), int(s[14:16]), tzinfo=timezone.utc), s)
+            except ValueError:
+                pass
+
         try:
-            date = datetime.strptime(str2Conv+'+0000', dateCSV.strCsvFormat+'%z')
-            return dateCSV(date)
+            return (datetime.strptime(str2Conv+'+0000',
+                dateCSV.strCsvFormat+'%z'), None)
         except:
             pass
 
         try:
-            date = datetime.strptime(str2Conv+'+0000',  '%m/%d/%Y %H:%M%z')
-            return dateCSV(date)
+            return (datetime.strptime(str2Conv+'+0000',  '%m/%d/%Y %H:%M%z'),
+                    None)
         except:
             debug("Unable to convert '%s'" % str2Conv)
-            return str2Conv
+            return False
+
+class ticketRow(MutableMapping):
+    # Row of the database: the known columns of the row are slots, the
+    # other ones are in a dict. The columns of dates are converted in
+    # dateCSV on first access.
+    __slots__ = tuple(config.jiraFields + config.localFields) + (
+            '_layout', '_extra', '_dates')
+    _slotSet = frozenset(config.jiraFields + config.localFields)
+    # Column names -> (names, set of names), shared by the rows
+    _layouts = dict()
+
+    def __init__(self, fields, values=(), dates=None):
+        # Same as dict.fromkeys(fields) updated with values
+        layout = ticketRow._layouts.get(tuple(fields))
+        if layout == None:
+            layout = (tuple(fields), frozenset(fields))
+            ticketRow._layouts[layout[0]] = layout
+        self._layout = layout
+        self._extra = None
+        self._dates = dates
+        if hasattr(values, 'items'):
+            values = values.items()
+        slots = ticketRow._slotSet
+        for k, v in values:
+            if k in slots and k in layout[1]:
+                setattr(self, k, v)
+            else:
+                self[k] = v
+
+    def _isSlot(self, k):
+        return k in ticketRow._slotSet and k in self._layout[1]
+
+    def project(self, fields, default=None):
+        # [values of fields], same as DictWriter for the missing fields
+        if self._extra != None:
+            wrongFields = [k for k in self if not k in fields]
+            if len(wrongFields) > 0:
+                raise ValueError("dict contains fields not in fieldnames: "
+                        + ", ".join(repr(k) for k in wrongFields))
+        ret = list()
+        layout = self._layout[1]
+        for f in fields:
+            if f in ticketRow._slotSet and f in layout:
+                v = getattr(self, f, None)
+                if (v and self._dates != None and f in self._dates
+                        and isinstance(v, str)):
+                    v = self[f]
+                ret.append(v)
+            elif f in self:
+                ret.append(self[f])
+            else:
+                ret.append(default)
+        return ret
+
+    def __getitem__(self, k):
+        if k in ticketRow._slotSet and k in self._layout[1]:
+            v = getattr(self, k, None)
+            if (v and self._dates != None and k in self._dates
+                    and isinstance(v, str)):
+                v = dateCSV.fromCsv(v)
+                setattr(self, k, v)
+            return v
+        if self._extra != None and k in self._extra:
+            return self._extra[k]
+        if k in self._layout[1]:
+            return None
+        raise KeyError(k)
+
+    def __setitem__(self, k, v):
+        if k in ticketRow._slotSet and k in self._layout[1]:
+            setattr(self, k, v)
+            return
+        if self._extra == None:
+            self._extra = dict()
+        self._extra[k] = v
+
+    def __delitem__(self, k):
+        if not k in self:
+            raise KeyError(k)
+        v = self[k]
+        if self._isSlot(k) and hasattr(self, k):
+            delattr(self, k)
+        if self._extra != None:
+            self._extra.pop(k, None)
+        if k in self._layout[1]:
+            # Move the other columns in the new layout
+            values = list(self.items())
+            ticketRow.__init__(self, [f for f in self._layout[0] if f != k],
+                    dates=self._dates)
+            for f in ticketRow._slotSet:
+                if hasattr(self, f):
+                    delattr(self, f)
+            for name, value in values:
+                if name != k:
+                    self[name] = value
+
+    def __contains__(self, k):
+        return (k in self._layout[1]
+                or (self._extra != None and k in self._extra))
+
+    def __iter__(self):
+        yield from self._layout[0]
+        if self._extra != None:
+            for k in list(self._extra.keys()):
+                if not k in self._layout[1]:
+                    yield k
+
+    def __len__(self):
+        extraNbr = 0
+        if self._extra != None:
+            extraNbr = len([k for k in self._extra.keys()
+                if not k in self._layout[1]])
+        return len(self._layout[0]) + extraNbr
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class dbStorage():
+    # Database of tickets: CSV file or SQLite file
+    name = None
+    fieldnames = None
+    sqliteExts = ['.db', '.sqlite', '.sqlite3']
+
+    def open(fdIn, journalSize=0, keyIndex=False):
+        try:
+            with open(fdIn.name, 'rb') as fd:
+                isSqlite = fd.read(16) == b'SQLite format 3\x00'
+        except Exception:
+            isSqlite = False
+
+        try:
+            if isSqlite:
+                return sqliteStorage(fdIn.name)
+            return csvStorage(fdIn, journalSize, keyIndex)
+        except Exception as inst:
+            debug("Fail to open database %s: %s" % (fdIn.name, inst))
+            return None
+
+    def openOutput(path, fields):
+        # Writer for a new database, type chosen by the file extension
+        try:
+            if os.path.splitext(path)[1].lower() in dbStorage.sqliteExts:
+                return sqliteWriter(sqliteStorage(path), fields)
+            return csvWriter(path, fields)
+        except Exception as inst:
+            debug("Fail to create database %s: %s" % (path, inst))
+            return None
+
+    def version(self):
+        # Changes when the database is modified
+        stat = os.stat(self.name)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def searchKeys(self, conditions, isOr=True):
+        # Union (or intersection) of the keys matching each condition
+        foundKeys = None
+        if not 'key' in self.fieldnames:
+            return set()
+
+        for k, v in conditions:
+            keys = self.findKeys(k, v)
+            if foundKeys == None:
+                foundKeys = set(keys)
+            elif isOr:
+                foundKeys |= keys
+            else:
+                foundKeys &= keys
+
+        return foundKeys or set()
+
+    def indexedFields(self):
+        # Columns searched without reading all the rows
+        return list()
+
+    def scan(self):
+        # Rows read once in order, without keeping them in memory
+        return self.rows()
+
+    def close(self):
+        pass
+
+class rowTable():
+    # Rows loaded once, indexed by key and by column on demand
+    fieldnames = None
+    _rows = None
+    _keyIndex = None
+    _indexes = None
+
+    def __init__(self, fieldnames, rows):
+        self.fieldnames = fieldnames
+        self._rows = rows
+        self._keyIndex = dict()
+        self._indexes = dict()
+        for pos, row in enumerate(rows):
+            if row.get('key'):
+                self._keyIndex.setdefault(row['key'].strip(), list()).append(pos)
+
+    def rows(self):
+        # Copies: callers are free to modify the rows
+        for row in self._rows:
+            yield dict(row)
+
+    def select(self, keys):
+        positions = sorted(pos for key in keys
+                for pos in self._keyIndex.get(key, list()))
+        for pos in positions:
+            yield dict(self._rows[pos])
+
+    def has(self, key):
+        return key in self._keyIndex
+
+    def apply(self, changes, newRows=list()):
+        for key, values in changes.items():
+            for pos in self._keyIndex.get(key, list()):
+                self._rows[pos].update(values)
+        for row in newRows:
+            if row.get('key'):
+                self._keyIndex.setdefault(row['key'].strip(),
+                        list()).append(len(self._rows))
+            self._rows.append(row)
+        self._indexes = dict()
+
+    def findKeys(self, col, value):
+        if col not in self._indexes:
+            index = dict()
+            for row in self._rows:
+                if row.get('key'):
+                    index.setdefault(row.get(col), set()).add(row['key'].strip())
+            self._indexes[col] = index
+        return self._indexes[col].get(value, set())
+
+    def indexedFields(self):
+        return list(self._indexes)
+
+class csvWriter():
+    # Rows are written in a temporary file next to the target, synced and
+    # renamed over it on commit
+    _fd = None
+    _csvOut = None
+    _target = None
+    _backup = False
+
+    def __init__(self, target, fields, backup=False):
+        # backup: keep the replaced file as <target>.old
+        self._target = target
+        self._backup = backup
+        self._fd = tempfile.NamedTemporaryFile(mode='w', newline='',
+                dir=os.path.dirname(os.path.abspath(target)),
+                prefix='.' + os.path.basename(target) + '.',
+                suffix='.tmp', delete=False)
+        self._csvOut = csv.DictWriter(self._fd, fields,
+                quoting=csv.QUOTE_NONNUMERIC)
+        self._csvOut.writeheader()
+
+    def writerow(self, row):
+        if isinstance(row, ticketRow):
+            return self._csvOut.writer.writerow(
+                    row.project(self._csvOut.fieldnames, ""))
+        return self._csvOut.writerow(row)
+
+    def commit(self):
+        ret = True
+        try:
+            self._fd.flush()
+            os.fsync(self._fd.fileno())
+            runStats.written(os.fstat(self._fd.fileno()).st_size)
+            self._fd.close()
+            if os.path.exists(self._target):
+                shutil.copymode(self._target, self._fd.name)
+                if self._backup:
+                    csvWriter._link(self._target, self._target + '.old')
+            else:
+                os.chmod(self._fd.name, 0o644)
+            os.replace(self._fd.name, self._target)
+            csvWriter._syncDir(self._target)
+            # Changes journaled against the replaced file are obsolete
+            if os.path.exists(self._target + csvStorage.journalExt):
+                os.unlink(self._target + csvStorage.journalExt)
+        except Exception as inst:
+            debug("Failed to save %s: %s" % (self._target, inst))
+            ret = False
+        self.abort()
+        return ret
+
+    def abort(self):
+        if self._fd == None:
+            return
+        self._fd.close()
+        if os.path.exists(self._fd.name):
+            os.unlink(self._fd.name)
+        self._fd = None
+
+    def __del__(self):
+        self.abort()
+
+    def _link(src, dst):
+        # Hard link: the backup costs no copy
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+    def _syncDir(path):
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+class csvStorage(dbStorage):
+    # Small changes are appended to <file>.journal and merged in the CSV
+    # file by the next full write
+    journalExt = '.journal'
+    # Offset and length of the rows of each key in <file>.idx
+    indexExt = '.idx'
+    _fd = None
+    _table = None
+    _base = None
+    _journalSize = 0
+    _keyIndex = False
+    _isWarned = False
+
+    def __init__(self, fdIn, journalSize=0, keyIndex=False):
+        # Read as recommended by the csv module: the line ends in the quoted
+        # values are kept, like in the rows read through the key index
+        fdIn.reconfigure(newline='')
+        self._fd = fdIn
+        self.name = fdIn.name
+        self._journalSize = journalSize
+        self._keyIndex = keyIndex
+        stat = os.fstat(fdIn.fileno())
+        self._base = [stat.st_size, stat.st_mtime_ns]
+        fdIn.seek(0)
+        self.fieldnames = csv.DictReader(fdIn).fieldnames or list()
+
+    def rows(self):
+        return self._getTable().rows()
+
+    def select(self, keys):
+        return self._selectTable(keys).select(keys)
+
+    def findKeys(self, col, value):
+        return self._getTable().findKeys(col, value)
+
+    def indexedFields(self):
+        # Only the indexes of a table already loaded (serve)
+        if self._table == None:
+            return list()
+        return self._table.indexedFields()
+
+    def scan(self):
+        if self._table != None:
+            return self._table.rows()
+        return self._scanFile()
+
+    def _scanFile(self):
+        # Rows of the file with the journal changes, the journal is read first
+        changes = dict()
+        newRows = list()
+        for entryChanges, entryRows in self._journal():
+            for key, values in entryChanges.items():
+                changes.setdefault(key, dict()).update(values)
+                for row in newRows:
+                    if (row.get('key') or '').strip() == key:
+                        row.update(values)
+            newRows.extend(entryRows)
+
+        self._fd.seek(0)
+        for row in csv.DictReader(self._fd):
+            key = (row.get('key') or '').strip()
+            if key in changes:
+                row.update(changes[key])
+            yield row
+        runStats.read(self._base[0])
+        for row in newRows:
+            yield row
+
+    def _getTable(self):
+        # The file is parsed only once
+        if self._table == None:
+            self._fd.seek(0)
+            csvIn = csv.DictReader(self._fd)
+            self._table = rowTable(csvIn.fieldnames or list(), list(csvIn))
+            runStats.read(self._base[0])
+            for changes, newRows in self._journal():
+                self._table.apply(changes, newRows)
+        return self._table
+
+    def _selectTable(self, keys):
+        # Table of the rows with those keys, read through the key index
+        # when the whole file is not loaded yet
+        if self._table != None or not self._keyIndex:
+            return self._getTable()
+
+        offsets = self._lookup(keys)
+        if offsets == None:
+            return self._getTable()
+
+        rows = list()
+        with open(self.name, 'rb') as fd:
+            for offset, length in sorted(offsets):
+                fd.seek(offset)
+                rows.append(self._parseRecord(fd.read(length)))
+                runStats.read(length)
+
+        table = rowTable(self.fieldnames, rows)
+        for changes, newRows in self._journal():
+            table.apply({k: v for k, v in changes.items() if k in keys},
+                    [row for row in newRows if row.get('key') in keys])
+        return table
+
+    def _parseRecord(self, record):
+        values = next(csv.reader(io.StringIO(record.decode(
+            self._fd.encoding), newline='')), list())
+        row = dict(zip(self.fieldnames, values))
+        # Same as DictReader for short or long rows
+        for field in self.fieldnames[len(values):]:
+            row[field] = None
+        if len(values) > len(self.fieldnames):
+            row[None] = values[len(self.fieldnames):]
+        return row
+
+    def _lookup(self, keys):
+        # [(offset, length)] of the rows, None if no index is usable
+        path = self.name + self.indexExt
+        try:
+            db = sqlite3.connect('file:%s?mode=ro'
+                    % urllib.parse.quote(os.path.abspath(path)), uri=True)
+            try:
+                base = db.execute('SELECT size, mtime FROM base').fetchone()
+                if list(base) != self._base:
+                    raise sqlite3.DatabaseError('outdated index')
+                keys = list(keys)
+                ret = list()
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i+500]
+                    ret += db.execute('SELECT offset, length FROM rows '
+                            + 'WHERE key IN (%s)' % ','.join('?' * len(chunk)),
+                            chunk).fetchall()
+                return ret
+            finally:
+                db.close()
+        except sqlite3.Error:
+            pass
+
+        # Missing or outdated: build it for the next commands
+        offsets = self._buildIndex(path)
+        if offsets == None:
+            return None
+        return [pos for key in keys for pos in offsets.get(key, list())]
+
+    def _buildIndex(self, path):
+        offsets = dict()
+        try:
+            with open(self.name, 'rb') as fd:
+                records = csvStorage._records(fd)
+                next(records, None)
+                for offset, record in records:
+                    key = self._parseRecord(record).get('key')
+                    if key:
+                        offsets.setdefault(key.strip(), list()).append(
+                                (offset, len(record)))
+            runStats.read(self._base[0])
+        except Exception as inst:
+            debug("Fail to index %s: %s" % (self.name, inst))
+            return None
+
+        try:
+            self._writeIndex(path, offsets)
+        except (OSError, sqlite3.Error):
+            # Ex: read-only directory, the offsets are only used by this command
+            pass
+        return offsets
+
+    def _writeIndex(self, path, offsets):
+        # Same mode as the CSV file: the index is shared with its readers
+        fd = tempfile.NamedTemporaryFile(delete=False,
+                dir=os.path.dirname(os.path.abspath(path)),
+                prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+        fd.close()
+        try:
+            shutil.copymode(self.name, fd.name)
+            db = sqlite3.connect(fd.name)
+            with db:
+                db.execute('CREATE TABLE base (size, mtime)')
+                db.execute('INSERT INTO base VALUES (?, ?)', self._base)
+                db.execute('CREATE TABLE rows (key, offset, length)')
+                db.executemany('INSERT INTO rows VALUES (?, ?, ?)',
+                        ((key, offset, length)
+                            for key, posArr in offsets.items()
+                            for offset, length in posArr))
+                db.execute('CREATE INDEX idx_key ON rows (key)')
+            db.close()
+            os.replace(fd.name, path)
+        finally:
+            if os.path.exists(fd.name):
+                os.unlink(fd.name)
+
+    def _records(fd):
+        # (offset, bytes) of each CSV record: a record ends with a line
+        # closing all its quotes
+        offset = 0
+        start = 0
+        lines = list()
+        quotes = 0
+        for line in fd:
+            if len(lines) == 0:
+                start = offset
+            lines.append(line)
+            quotes += line.count(b'"')
+            offset += len(line)
+            if quotes % 2 == 0:
+                yield start, b''.join(lines)
+                lines = list()
+                quotes = 0
+        if len(lines) > 0:
+            yield start, b''.join(lines)
+
+    def version(self):
+        ret = dbStorage.version(self)
+        try:
+            stat = os.stat(self.name + self.journalExt)
+            ret += [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            pass
+        return ret
+
+    def _journal(self):
+        # (changes, newRows) of the journal entries
+        try:
+            fd = open(self.name + self.journalExt, 'r')
+        except FileNotFoundError:
+            return
+        except Exception as inst:
+            debug("Fail to read %s: %s" % (self.name + self.journalExt, inst))
+            return
+
+        fileRows = None
+        conflicts = list()
+        with fd:
+            for line in fd:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Interrupted write
+                    debug("Ignore truncated entry of %s" % fd.name)
+                    continue
+                changes = entry.get('changes', dict())
+                newRows = entry.get('new', list())
+                # The CSV file was modified by another program (a full write
+                # removes the journal): only the values it did not modify
+                # are changed
+                if entry.get('base') != self._base:
+                    if fileRows == None:
+                        fileRows = self._fileRows()
+                    changes, newRows = csvStorage._merge(fileRows, changes,
+                            newRows, entry.get('old', dict()), conflicts)
+                yield changes, newRows
+            runStats.read(fd.tell())
+
+        if len(conflicts) > 0 and not self._isWarned:
+            debug("Warning: %s modified after the changes of %s, its values "
+                    "are kept for: %s" % (self.name, fd.name,
+                        ', '.join(conflicts)))
+            self._isWarned = True
+
+    def _fileRows(self):
+        # First row of each key in the CSV file, without the journal
+        self._fd.seek(0)
+        rows = dict()
+        for row in csv.DictReader(self._fd):
+            rows.setdefault((row.get('key') or '').strip(), row)
+        runStats.read(self._base[0])
+        return rows
+
+    def _merge(fileRows, changes, newRows, old, conflicts):
+        # Journal entry older than the file: the values changed since the
+        # entry (old: values before the entry) are not overwritten, the new
+        # rows already in the file are not added again
+        merged = dict()
+        for key, values in changes.items():
+            row = fileRows.get(key)
+            if row == None:
+                conflicts.append("%s (removed)" % key)
+                continue
+            for field, value in values.items():
+                if row.get(field) == value:
+                    continue
+                if field in old.get(key, dict()) \
+                        and row.get(field) == old[key][field]:
+                    merged.setdefault(key, dict())[field] = value
+                    row[field] = value
+                else:
+                    conflicts.append("%s %s" % (key, field))
+
+        rows = list()
+        for row in newRows:
+            key = (row.get('key') or '').strip()
+            if key in fileRows:
+                conflicts.append("%s (added)" % key)
+                continue
+            fileRows[key] = dict(row)
+            rows.append(row)
+        return merged, rows
+
+    def openWriter(self, fields, outPath=None):
+        if outPath:
+            return dbStorage.openOutput(outPath, fields)
+
+        try:
+            return csvWriter(self.name, fields, backup=True)
+        except Exception as inst:
+            debug("Fail to create CSV output file: %s" % inst)
+            return None
+
+    def modify(self, changes, newRows=list()):
+        # Return the keys not found, None on failure
+        table = self._selectTable(set(changes.keys()))
+        missing = set(key for key in changes.keys() if not table.has(key))
+        # Values written as in the CSV file (the rows of edit hold dateCSV)
+        changes = {k: csvStorage._strings(v, v.keys())
+                for k, v in changes.items() if not k in missing}
+        newRows = [csvStorage._strings(row, self.fieldnames) for row in newRows]
+        # Values replaced, to detect the ones modified by another program
+        old = {k: csvStorage._strings(next(table.select([k])), v.keys())
+                for k, v in changes.items()}
+
+        entry = json.dumps({'base': self._base, 'changes': changes,
+            'old': old, 'new': newRows}) + '\n'
+        if not self._appendJournal(entry):
+            # Journal full or disabled: write the whole file
+            self._getTable().apply(changes, newRows)
+            return missing if self._compact() else None
+
+        if self._table != None:
+            self._table.apply(changes, newRows)
+        return missing
+
+    def _strings(row, fields):
+        return {f: "" if row.get(f) is None else str(row.get(f))
+                for f in fields}
+
+    def _appendJournal(self, entry):
+        journal = self.name + self.journalExt
+        try:
+            size = os.path.getsize(journal)
+        except OSError:
+            size = 0
+        if size + len(entry) > self._journalSize:
+            return False
+
+        try:
+            fd = os.open(journal, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # Terminate an entry left incomplete by a crash
+                if size > 0 and os.pread(fd, 1, size - 1) != b'\n':
+                    entry = '\n' + entry
+                runStats.written(os.write(fd, entry.encode()))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except Exception as inst:
+            debug("Fail to write %s: %s" % (journal, inst))
+            return False
+        return True
+
+    def _compact(self):
+        writer = self.openWriter(self.fieldnames)
+        if writer == None:
+            return False
+        for row in self._table.rows():
+            writer.writerow(row)
+        if not writer.commit():
+            return False
+
+        stat = os.stat(self.name)
+        self._base = [stat.st_size, stat.st_mtime_ns]
+        return True
+
+    def close(self):
+        self._fd.close()
+
+class sqliteWriter():
+    # Rows are written in a new table replacing the old one on commit
+    _storage = None
+
+    def __init__(self, storage, fields):
+        self._storage = storage
+        db = storage._db
+        db.execute('BEGIN')
+        db.execute('DROP TABLE IF EXISTS tickets_new')
+        db.execute('CREATE TABLE tickets_new (%s)'
+                % ', '.join(sqliteStorage._quote(f) for f in fields))
+        self._insert = ('INSERT INTO tickets_new VALUES (%s)'
+                % ', '.join('?' * len(fields)))
+        self._fields = list(fields)
+
+    def writerow(self, row):
+        self._storage._db.execute(self._insert,
+                [sqliteStorage._value(row.get(f)) for f in self._fields])
+
+    def commit(self):
+        db = self._storage._db
+        try:
+            db.execute('DROP TABLE IF EXISTS tickets')
+            db.execute('ALTER TABLE tickets_new RENAME TO tickets')
+            self._storage._createIndexes()
+            db.commit()
+        except Exception as inst:
+            db.rollback()
+            debug("Failed to save %s: %s" % (self._storage.name, inst))
+            return False
+        return True
+
+class sqliteStorage(dbStorage):
+    _db = None
+    indexFields = ['key', 'trackstate', 'status']
+
+    def __init__(self, path):
+        self.name = path
+        # Transactions are explicit (BEGIN/COMMIT), the update can write
+        # from a worker thread
+        self._db = sqlite3.connect(path, isolation_level=None,
+                check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS tickets ("key")')
+        self._createIndexes()
+
+    @property
+    def fieldnames(self):
+        return [col[1] for col in
+                self._db.execute('PRAGMA table_info(tickets)')]
+
+    def rows(self):
+        cursor = self._db.execute('SELECT * FROM tickets ORDER BY rowid')
+        fields = [col[0] for col in cursor.description]
+        for values in cursor:
+            yield dict(zip(fields, values))
+
+    def select(self, keys):
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i+500]
+            cursor = self._db.execute('SELECT * FROM tickets '
+                    + 'WHERE trim(key) IN (%s) ORDER BY rowid'
+                    % ','.join('?' * len(chunk)), chunk)
+            fields = [col[0] for col in cursor.description]
+            for values in cursor:
+                yield dict(zip(fields, values))
+
+    def searchKeys(self, conditions, isOr=True):
+        fields = self.fieldnames
+        where = list()
+        params = list()
+        for k, v in conditions:
+            if k in fields:
+                where.append('%s = ?' % sqliteStorage._quote(k))
+                params.append(v)
+            elif not isOr:
+                return set()
+
+        if len(where) == 0:
+            return set()
+        cursor = self._db.execute('SELECT key FROM tickets WHERE '
+                + (' OR ' if isOr else ' AND ').join(where), params)
+        return set(row[0].strip() for row in cursor if row[0])
+
+    def indexedFields(self):
+        fields = self.fieldnames
+        return [field for field in self.indexFields if field in fields]
+
+    def openWriter(self, fields, outPath=None):
+        if outPath:
+            return dbStorage.openOutput(outPath, fields)
+        return sqliteWriter(self, fields)
+
+    def modify(self, changes, newRows=list()):
+        # Return the keys not found, None on failure
+        missing = set()
+        fields = self.fieldnames
+        try:
+            self._db.execute('BEGIN')
+            for key, values in changes.items():
+                cols = [k for k in values if k in fields]
+                if len(cols) == 0:
+                    continue
+                cursor = self._db.execute('UPDATE tickets SET %s '
+                        % ', '.join('%s = ?' % sqliteStorage._quote(k)
+                            for k in cols)
+                        + 'WHERE trim(key) = ?',
+                        [sqliteStorage._value(values[k]) for k in cols]
+                        + [key])
+                if cursor.rowcount == 0:
+                    missing.add(key)
+
+            for row in newRows:
+                self._db.execute('INSERT INTO tickets (%s) VALUES (%s)'
+                        % (', '.join(sqliteStorage._quote(f) for f in fields),
+                            ', '.join('?' * len(fields))),
+                        [sqliteStorage._value(row.get(f)) for f in fields])
+            self._db.commit()
+        except Exception as inst:
+            self._db.rollback()
+            debug("Failed to save %s: %s" % (self.name, inst))
+            return None
+
+        return missing
+
+    def close(self):
+        self._db.close()
+
+    def _createIndexes(self):
+        fields = self.fieldnames
+        for field in self.indexFields:
+            if field not in fields:
+                continue
+            # Keys are compared without spaces, like in CSV files
+            expr = sqliteStorage._quote(field)
+            if field == 'key':
+                expr = 'trim(%s)' % expr
+            self._db.execute('CREATE INDEX IF NOT EXISTS "idx_%s" '
+                    'ON tickets (%s)' % (field, expr))
+
+    def _quote(name):
+        return '"%s"' % name.replace('"', '""')
+
+    def _value(value):
+        if value == None:
+            return ''
+        return str(value)
+
+class filterError(Exception):
+    pass
+
+class filterExpr():
+    # Filter expression parsed once and compiled in a predicate on the rows,
+    # ex: status in (Open, Reopened) and (updated >= -7d or interest >= 2)
+    # Operators: = != < <= > >= ~ (regex) !~ in, combined with and, or, not
+    # and parentheses. Values are compared as numbers, as dates (YYYY-MM-DD
+    # [HH:MM], or -7d, -12h, -2w before now) or else as strings.
+    _tokenRe = re.compile(r'\s*(?:(!=|!~|<=|>=|[()=<>~,])'
+            r'|"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\''
+            r'|([^\s()=<>~!,"\']+))')
+    _dateRe = re.compile(r'^\d{4}-\d{2}-\d{2}( \d{2}:\d{2})?$')
+    _relDateRe = re.compile(r'^-(\d+)([hdw])$')
+    _relUnits = {'h': 'hours', 'd': 'days', 'w': 'weeks'}
+    _ops = ['=', '!=', '<', '<=', '>', '>=', '~', '!~']
+    text = None
+    fields = None
+    _tree = None
+    _tokens = None
+    _pos = 0
+
+    def __init__(self, text):
+        self.text = text
+        self.fields = list()
+        self._tokens = filterExpr._tokenize(text)
+        self._pos = 0
+        self._tree = self._parseOr()
+        if self._pos < len(self._tokens):
+            raise filterError("unexpected '%s'" % self._tokens[self._pos][1])
+
+    def compile(text):
+        # filterExpr of the text, None if invalid
+        try:
+            return filterExpr(text)
+        except filterError as inst:
+            debug("Invalid filter expression \"%s\": %s" % (text, inst))
+            return None
+
+    def predicate(self, fieldnames, manifest=None):
+        # Function row -> bool. Fields missing in the database are read in
+        # the ticket sheets of the manifest
+        getters = dict()
+        for field in self.fields:
+            if field in fieldnames or field == 'key':
+                getters[field] = (lambda f: lambda row: row.get(f))(field)
+            elif manifest != None:
+                getters[field] = (lambda f: lambda row: (manifest.sheet(
+                    (row.get('key') or '').strip()) or dict()).get(f))(field)
+            else:
+                debug("Unknown filter column: %s" % field)
+                getters[field] = lambda row: None
+        return self._compileNode(self._tree, getters)
+
+    def candidates(self, store, indexedFields):
+        # Keys of the rows which can match, from the key and the column
+        # indexes. None if all the rows have to be read
+        return self._candidates(self._tree, store, indexedFields)
+
+    def _tokenize(text):
+        # [(kind, value)], kind: 'op' or 'word' ('str' if quoted)
+        tokens = list()
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = filterExpr._tokenRe.match(text, pos)
+            if match == None or match.end() == pos:
+                raise filterError("unexpected '%s'" % text[pos:].strip())
+            pos = match.end()
+            if match.group(1):
+                tokens.append(('op', match.group(1)))
+            elif match.group(4):
+                tokens.append(('word', match.group(4)))
+            elif match.group(2) != None:
+                tokens.append(('str', match.group(2).replace('\\"', '"')))
+            else:
+                tokens.append(('str', match.group(3).replace("\\'", "'")))
+        return tokens
+
+    def _peek(self):
+        if self._pos < len(self._tokens):
+            return self._tokens[self._pos]
+        return (None, None)
+
+    def _next(self, expected=None):
+        kind, value = self._peek()
+        if kind == None:
+            raise filterError("unexpected end of expression")
+        if expected != None and value != expected:
+            raise filterError("'%s' expected before '%s'" % (expected, value))
+        self._pos += 1
+        return kind, value
+
+    def _isKeyword(self, word):
+        kind, value = self._peek()
+        return kind == 'word' and value.lower() == word
+
+    def _parseOr(self):
+        nodes = [self._parseAnd()]
+        while self._isKeyword('or'):
+            self._next()
+            nodes.append(self._parseAnd())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def _parseAnd(self):
+        nodes = [self._parseNot()]
+        while self._isKeyword('and'):
+            self._next()
+            nodes.append(self._parseNot())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def _parseNot(self):
+        if self._isKeyword('not'):
+            self._next()
+            return ('not', self._parseNot())
+        if self._peek() == ('op', '('):
+            self._next()
+            node = self._parseOr()
+            self._next(')')
+            return node
+        return self._parseCondition()
+
+    def _parseCondition(self):
+        kind, field = self._next()
+        if kind != 'word':
+            raise filterError("column expected before '%s'" % field)
+        field = field.lower()
+        if not field in self.fields:
+            self.fields.append(field)
+
+        if self._isKeyword('in'):
+            self._next()
+            self._next('(')
+            values = [self._parseValue()]
+            while self._peek() == ('op', ','):
+                self._next()
+                values.append(self._parseValue())
+            self._next(')')
+            return ('in', field, values)
+
+        kind, op = self._next()
+        if kind != 'op' or not op in filterExpr._ops:
+            raise filterError("operator expected after '%s'" % field)
+        value = self._parseValue()
+        if op in ['~', '!~']:
+            try:
+                return (op, field, re.compile(value))
+            except re.error as inst:
+                raise filterError("invalid regex '%s': %s" % (value, inst))
+        if op in ['=', '!=']:
+            return (op, field, value)
+
+        # Ordering: the type of the values is chosen by the given value
+        number = filterExpr._number(value)
+        if number != None:
+            return (op, field, number)
+        date = filterExpr._date(value)
+        if date != None:
+            return (op, field, date)
+        return (op, field, value)
+
+    def _parseValue(self):
+        kind, value = self._next()
+        if kind == 'op':
+            raise filterError("value expected before '%s'" % value)
+        return value
+
+    def _compileNode(self, node, getters):
+        op = node[0]
+        if op == 'and':
+            preds = [self._compileNode(n, getters) for n in node[1]]
+            return lambda row: all(p(row) for p in preds)
+        if op == 'or':
+            preds = [self._compileNode(n, getters) for n in node[1]]
+            return lambda row: any(p(row) for p in preds)
+        if op == 'not':
+            pred = self._compileNode(node[1], getters)
+            return lambda row: not pred(row)
+
+        get = getters[node[1]]
+        value = node[2]
+        if op == 'in':
+            values = frozenset(value)
+            return lambda row: filterExpr._str(get(row)) in values
+        if op == '=':
+            return lambda row: filterExpr._str(get(row)) == value
+        if op == '!=':
+            return lambda row: filterExpr._str(get(row)) != value
+        if op in ['~', '!~']:
+            isMatch = (op == '~')
+            return lambda row: ((value.search(filterExpr._str(get(row)))
+                != None) == isMatch)
+
+        cmp = {'<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+                '>': lambda a, b: a > b, '>=': lambda a, b: a >= b}[op]
+        if isinstance(value, float):
+            def compareNumber(row):
+                rowValue = filterExpr._number(get(row))
+                return rowValue != None and cmp(rowValue, value)
+            return compareNumber
+        if isinstance(value, datetime):
+            def compareDate(row):
+                rowValue = get(row)
+                if not isinstance(rowValue, dateCSV):
+                    if not rowValue:
+                        return False
+                    rowValue = dateCSV.fromCsv(rowValue)
+                return (isinstance(rowValue, dateCSV)
+                        and cmp(rowValue.date, value))
+            return compareDate
+        return lambda row: cmp(filterExpr._str(get(row)), value)
+
+    def _candidates(self, node, store, indexedFields):
+        op = node[0]
+        if op in ['and', 'or']:
+            keySets = [self._candidates(n, store, indexedFields)
+                    for n in node[1]]
+            if op == 'or':
+                if None in keySets:
+                    return None
+                return set().union(*keySets)
+            keySets = [keys for keys in keySets if keys != None]
+            if len(keySets) == 0:
+                return None
+            return set.intersection(*keySets)
+        if not op in ['=', 'in']:
+            return None
+
+        field = node[1]
+        values = node[2] if op == 'in' else [node[2]]
+        if field == 'key':
+            return set(values)
+        if not field in indexedFields:
+            return None
+        return store.searchKeys([(field, v) for v in values])
+
+    def _str(value):
+        if value == None:
+            return ''
+        return str(value)
+
+    def _number(value):
+        try:
+            return float(str(value))
+        except (TypeError, ValueError):
+            return None
+
+    def _date(value):
+        match = filterExpr._relDateRe.match(value)
+        if match:
+            delta = timedelta(**{filterExpr._relUnits[match.group(2)]:
+                int(match.group(1))})
+            return datetime.now(timezone.utc) - delta
+        if filterExpr._dateRe.match(value):
+            if len(value) == 10:
+                value += ' 00:00'
+            try:
+                return datetime.strptime(value + '+0000',
+                        dateCSV.strCsvFormat + '%z')
+            except ValueError:
+                raise filterError("invalid date '%s'" % value)
+        return None
 
 class action():
     _conf = None
     _jira = None
+    _store = None
+    _stores = None
+    # Daemon: the database stays loaded between the commands
+    _keepStore = False
     _files = { 'in' : None, 'out' : None }
 
     def __init__(self, conf):
         self._conf = conf
+        self._stores = list()
 
     def names(self):
         return list(self.funcs.keys())
 
     def runAction(self, args):
         ret = True
-        if args.action in self.funcs:
-            func = self.funcs[args.action]
-            ret = func(self, args)
-        else:
+        if hasattr(args, 'jobs') and args.jobs:
+            self._conf.jiraWorkers = max(1, args.jobs)
+        if hasattr(args, 'transport') and args.transport:
+            self._conf.jiraTransport = args.transport
+
+        if not args.action in self.funcs:
             debug("Action callback not found: %s" % args.action)
-            ret = False
+            return False
+
+        isStats = args.stats or args.stats_file
+        if isStats:
+            runStats.start(command=args.action, database=args.inFile.name)
+        profiler = None
+        if args.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        func = self.funcs[args.action]
+        ret = func(self, args)
+        sheetManifest.saveAll()
+
+        if profiler != None:
+            profiler.disable()
+            try:
+                profiler.dump_stats(args.profile)
+            except Exception as inst:
+                debug("Fail to write profile in %s: %s" % (args.profile, inst))
+        if isStats:
+            runStats.stop(status='ok' if ret else 'failed')
+            report = runStats.report()
+            if args.stats:
+                runStats.display(report)
+            if args.stats_file:
+                runStats.save(report, args.stats_file)
         return ret
 
     def update(self, args):
-        if not self._initJiraApi():
+        runStats.phase('connect')
+        if not self._initJiraApi(args):
             return False
+        self._jira.reset()
 
-        csvIn = self._initCsvReader(args.inFile)
-        if csvIn == None:
+        # Other databases updated with the same Jira requests
+        inFiles = [args.inFile] + args.databases
+        if args.outFile and len(inFiles) > 1:
+            debug("Option --outFile needs only one database")
             return False
 
-        outFields = conf.mergeFields(csvIn.fieldnames)
-        csvOut = self._initCsvWriter(args.outFile, outFields)
-        if csvOut == None:
-            return False
-
-        # stat var
-        rowNbr = 1
-        updatedKeys = list()
-        newKeys = list()
-        lastCreated = dateCSV(datetime(1900,1,1, tzinfo=timezone.utc))
-
-        # Update existing row
-        for rowIn in csvIn:
-            rowNbr+=1
-            if 'key' not in rowIn or not self._checkKeyFormat(rowIn['key']):
-                debug("Invalid 'key' at %s:%d" % (args.inFile.name, rowNbr))
-                continue
-
-            self._convertCvsDate(rowIn)
-            rowOut = self._initFields(rowIn, outFields)
-
-            if self._jira.update(rowOut, args.force):
-                updatedKeys.append(rowOut['key'])
-                debug("Update row %d (%s)" % (rowNbr, rowOut['key']))
-
-            if isinstance(rowOut['created'], dateCSV):
-                lastCreated = dateCSV(max(lastCreated.date, rowOut['created'].date))
-            try:
-                csvOut.writerow(rowOut)
-            except Exception as inst:
-                debug("Fail to write csv row %d: %s" % (rowNbr, inst))
+        runStats.phase('read')
+        targets = list()
+        for fdIn in inFiles:
+            target = self._readTarget(fdIn, args.outFile)
+            if target == None:
+                return False
+            targets.append(target)
+
+        # Update existing row (batched Jira requests): the rows of all the
+        # databases are synchronized together, each ticket is fetched once
+        runStats.phase('sync')
+        rows = [row for target in targets for row in target.rows]
+        state = syncState.merge([target.state for target in targets],
+                [set(row['key'] for row in target.rows
+                    if row['trackstate'] in ['Follow', 'Updated'])
+                    for target in targets])
+        syncStart = self._jira.serverTime(state)
+        isUpdated = self._jira.updateRows(rows, args.force, state)
+        # Cached tickets were synchronized before
+        cacheStart = self._jira.cacheTime(state)
+        if cacheStart != None and cacheStart.date < syncStart.date:
+            syncStart = cacheStart
+
+        for target in targets:
+            target.state.serverOffset = state.serverOffset
+            target.isUpdated = isUpdated[:len(target.rows)]
+            isUpdated = isUpdated[len(target.rows):]
+            for rowOut, rowUpNbr, rowUpdated in zip(target.rows,
+                    target.rowNbrs, target.isUpdated):
+                if rowUpdated:
+                    target.updatedKeys.append(rowOut['key'])
+                    debug("Update row %d (%s)" % (rowUpNbr, rowOut['key']))
+
+                if isinstance(rowOut['created'], dateCSV):
+                    target.lastCreated = dateCSV(max(target.lastCreated.date,
+                        rowOut['created'].date))
+
+        # The rows of the databases are written in parallel
+        runStats.phase('write')
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            if not all(pool.map(self._writeTarget, targets)):
                 return False
 
-        # Adding new row
+        # Adding new row: one request from the oldest last entry, each
+        # ticket is written as its page is received
         if not args.no_news:
-            debug("Creation date of the last entry in the database: %s" % lastCreated)
+            runStats.phase('news')
+            lastCreated = min((target.lastCreated for target in targets),
+                    key=lambda date: date.date)
+            debug("Creation date of the last entry in the database: %s"
+                    % lastCreated)
             for jiraData in self._jira.news(lastCreated):
-                rowNbr+=1
-                rowOut = self._initFields(jiraData, outFields)
-                debug("Add new row %d (%s)" % (rowNbr, rowOut['key']))
-
-                try:
-                    csvOut.writerow(rowOut)
-                except Exception as inst:
-                    debug("Fail to write csv row %d: %s" % (rowNbr, inst))
-                    return False
-
-                newKeys.append(rowOut['key'])
+                for target in targets:
+                    if not self._jira.isCreatedSince(jiraData,
+                            target.lastCreated):
+                        continue
+                    rowOut = self._initFields(jiraData, target.outFields)
+                    target.rowNbr += 1
+                    debug("Add new row %d (%s)" % (target.rowNbr, rowOut['key']))
+                    try:
+                        target.dbOut.writerow(rowOut)
+                    except Exception as inst:
+                        debug("Fail to write csv row %d: %s"
+                                % (target.rowNbr, inst))
+                        return False
+                    target.newKeys.append(rowOut['key'])
+
+        runStats.phase('commit')
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            if not all(pool.map(lambda target: target.dbOut.commit(),
+                    targets)):
+                return False
 
-        # Clean
-        del csvIn, csvOut
-        if not self._save(args.outFile):
-            return False
+        self._jira.saveCache()
+        failedKeys = set(self._jira.failedKeys)
+        for target in targets:
+            if not args.outFile:
+                self._updateIndex(self._changedRows(target), target.version,
+                        target.store)
+
+            # Save the sync watermark only if all the rows are synchronized
+            if all(not row['key'] in failedKeys for row in target.rows):
+                target.state.update(syncStart, [row['key']
+                    for row in target.rows
+                    if row['trackstate'] in ['Follow', 'Updated']])
+                target.state.save(target.outName + '.sync')
+
+        runStats.phase(None)
+        for target in targets:
+            runStats.count('rows', target.rowNbr - 1)
+            runStats.count('updatedRows', len(target.updatedKeys))
+            runStats.count('newRows', len(target.newKeys))
+        runStats.count('failedRows', len(failedKeys))
 
         # Report
-        debug("\nNumber of updated rows: %d/%d," % (len(updatedKeys), rowNbr-1))
-        debug(" " + jiraUpdate.link(self._conf.jiraURLRoot, updatedKeys))
-        debug("Number of new rows: %d/%d," % (len(newKeys), rowNbr-1))
-        debug(" " + jiraUpdate.link(self._conf.jiraURLRoot, newKeys))
+        for target in targets:
+            rowNbr = target.rowNbr - 1
+            if len(targets) > 1:
+                debug("\n%s:" % target.store.name)
+            debug("\nNumber of updated rows: %d/%d,"
+                    % (len(target.updatedKeys), rowNbr))
+            debug(" " + jiraUpdate.link(self._conf.jiraURLRoot,
+                target.updatedKeys))
+            debug("Number of new rows: %d/%d," % (len(target.newKeys), rowNbr))
+            debug(" " + jiraUpdate.link(self._conf.jiraURLRoot,
+                target.newKeys))
+            targetKeys = set(row['key'] for row in target.rows)
+            targetFailed = [key for key in self._jira.failedKeys
+                    if key in targetKeys]
+            if len(targetFailed) > 0:
+                debug("Number of rows not synchronized: %d/%d,"
+                        % (len(targetFailed), rowNbr))
+                debug(" " + jiraUpdate.link(self._conf.jiraURLRoot,
+                    targetFailed))
 
         return True
 
     def edit(self, args):
-        csvIn = self._initCsvReader(args.inFile)
-        if csvIn == None:
+        store = self._initStorage(args.inFile)
+        if store == None:
             return False
 
         keys = set()
@@ -285,7 +1818,10 @@ class action():
                 debug("Invalid key id: %s" % key)
 
         # Add keys matching filters
-        keys.update(self._searchKeysFromArg(args))
+        found = self._searchKeysFromArg(args)
+        if found == None:
+            return False
+        keys.update(found)
 
         if len(keys) <= 0:
             debug('No sheet to be edited')
@@ -293,16 +1829,7 @@ class action():
 
         debug("Editing keys: %s" % ', '.join(keys))
 
-        csvOut = self._initCsvWriter(None, csvIn.fieldnames)
-        if csvOut == None:
-            return False
-
-        sheetDir = args.sheetDir
-        if not sheetDir:
-            sheetDir = os.path.dirname(args.inFile.name)
-            if not sheetDir:
-                sheetDir = '.'
-            sheetDir += '/sheets'
+        sheetDir = self._sheetDir(args)
 
         if not os.path.isdir(sheetDir):
             try:
@@ -311,40 +1838,92 @@ class action():
                 debug("Failed to create %s: %s" % (sheetDir, inst))
                 return False
 
-        for rowIn in csvIn:
-            if 'key' in rowIn and rowIn['key'] in keys:
-                keys.remove(rowIn['key'])
-                if not self._editSheet(rowIn['key'],
-                        sheetDir,
-                        rowIn,
-                        update=(not args.no_update)):
-                    return False
-
-            csvOut.writerow(rowIn)
+        changes = dict()
+        for rowIn in list(store.select(keys)):
+            key = rowIn['key'].strip()
+            keys.discard(key)
+            if not self._editSheet(key,
+                    sheetDir,
+                    rowIn,
+                    update=(not args.no_update)):
+                return False
+            changes[key] = rowIn
 
+        newRows = list()
         for key in keys:
             debug("Ticket key \"%s\" not found in %s" % (key, args.inFile.name))
             debug("Try to add %s in database" % key)
 
-            outFields = conf.mergeFields(rowIn.keys())
-            newRow = self._initFields({'key': key}, outFields)
+            outFields = conf.mergeFields(store.fieldnames)
+            newRows.append(self._initFields({'key': key}, outFields))
 
-            if self._initJiraApi():
-                self._jira.update(newRow, True)
+        # Fetch all the missing keys before editing
+        if len(newRows) > 0 and self._initJiraApi(args):
+            self._jira.updateRows(newRows, True)
+            self._jira.saveCache()
+
+        for newRow in newRows:
             if not self._editSheet(newRow['key'], sheetDir, newRow,update=True):
                 return False
 
-            csvOut.writerow({k:newRow[k] for k in csvIn.fieldnames})
-
-        del csvIn, csvOut
-        return self._save(None)
+        version = store.version()
+        if store.modify(changes, newRows) == None:
+            return False
+        self._updateIndex(store.select(set(changes.keys())
+            | set(row['key'] for row in newRows)), version)
+        return True
 
     def search(self, args):
-        print("search")
+        store = self._initStorage(args.inFile)
+        if store == None or not 'key' in store.fieldnames:
+            return False
+
+        index = searchIndex.open(store.name + searchIndex.ext, self._conf,
+                create=True)
+        if index == None:
+            return False
+
+        try:
+            # Index the rows and sheets modified since the last search
+            version = store.version()
+            if index.version() != version:
+                index.updateRows(store.rows(), complete=True)
+                index.setVersion(version)
+
+            sheetDir = self._sheetDir(args)
+            if os.path.isdir(sheetDir):
+                manifest = sheetManifest.open(sheetDir)
+                if manifest.scan():
+                    index.updateSheets(manifest)
+
+            results = index.search(args.searchCmd)
+        except Exception as inst:
+            debug("Fail to search in %s: %s" % (store.name, inst))
+            return False
+        finally:
+            index.close()
+
+        if args.limit > 0:
+            results = results[:args.limit]
+
+        if args.ids:
+            print(' '.join(key for key, score, fields in results),
+                    file=outStream())
+            return True
+
+        rows = {row['key'].strip(): row
+                for row in store.select(set(r[0] for r in results))}
+        for key, score, fields in results:
+            print("%s (%s): %s" % (key, ', '.join(fields),
+                rows.get(key, dict()).get('summary') or ""), file=outStream())
+
+        if len(results) <= 0:
+            debug("No ticket found")
+        return True
 
     def mail(self, args):
-        csvIn = self._initCsvReader(args.inFile)
-        if csvIn == None or not 'key' in csvIn.fieldnames:
+        store = self._initStorage(args.inFile)
+        if store == None or not 'key' in store.fieldnames:
             return False
         self._files['out'] = args.outFile
         fdOut = args.outFile
@@ -357,28 +1936,34 @@ class action():
                 debug("Invalid key id: %s" % key)
 
         # Add keys matching filters
-        keys.update(self._searchKeysFromArg(args))
+        found = self._searchKeysFromArg(args)
+        if found == None:
+            return False
+        keys.update(found)
 
         if len(keys) <= 0:
             debug('No sheet to display')
             return False
 
-        debug("Display sheets with keys: %s" % ', '.join(keys))
+        sheetDir = self._sheetDir(args)
+
+        # Sheets read from the manifest: only the modified ones are parsed
+        manifest = sheetManifest.open(sheetDir)
+        if not os.path.isdir(sheetDir) or not manifest.scan():
+            manifest = None
 
-        sheetDir = args.sheetDir
-        if not sheetDir:
-            sheetDir = os.path.dirname(args.inFile.name)
-            if not sheetDir:
-                sheetDir = '.'
-            sheetDir += '/sheets'
+        keys = self._sortKeys(keys, args.sort, store, manifest)
+        if keys == None:
+            return False
+        debug("Display sheets with keys: %s" % ', '.join(keys))
 
+        # Sheets are rendered by a pool of workers and written in order
         notFound = list()
-        for key in keys:
-            sheet = sheetObj.open(key, sheetDir, template=False)
-            if sheet is None:
+        for key, sheetStr in self._renderSheets(keys, sheetDir, manifest):
+            if sheetStr == None:
                 notFound.append(key)
             else:
-                fdOut.write("%s--  \n\n" % sheet)
+                fdOut.write(sheetStr)
 
         if len(notFound) > 0:
             debug("Warning: following sheet not found: %s" % ', '.join(notFound))
@@ -390,8 +1975,8 @@ class action():
         return True
 
     def modify(self, args):
-        csvIn = self._initCsvReader(args.inFile)
-        if csvIn == None:
+        store = self._initStorage(args.inFile)
+        if store == None:
             return False
 
         keys = set()
@@ -403,7 +1988,10 @@ class action():
                     debug("Invalid key id: %s" % key)
 
         # Add keys matching filters
-        keys.update(self._searchKeysFromArg(args))
+        found = self._searchKeysFromArg(args)
+        if found == None:
+            return False
+        keys.update(found)
 
         if len(keys) <= 0:
             debug('No ticket ID entries to modify')
@@ -415,7 +2003,7 @@ class action():
             splitVal = value.split('=', 1)
             if len(splitVal) != 2:
                 debug("Malformed value string '%s'" % value)
-            elif not splitVal[0] in csvIn.fieldnames:
+            elif not splitVal[0] in store.fieldnames:
                 debug("Unknown value key '%s'" % splitVal[0])
             else:
                 valuesDict.update({splitVal[0]: splitVal[1]})
@@ -426,25 +2014,21 @@ class action():
 
         debug("Modifying keys: %s" % ', '.join(keys))
 
-        csvOut = self._initCsvWriter(None, csvIn.fieldnames)
-        if csvOut == None:
+        version = store.version()
+        missing = store.modify({key: valuesDict for key in keys})
+        if missing == None:
             return False
+        runStats.count('rows', len(keys) - len(missing))
+        self._updateIndex(store.select(keys), version)
 
-        for row in csvIn:
-            if row['key'] in keys:
-                keys.remove(row['key'])
-                row.update(valuesDict)
-            csvOut.writerow(row)
-
-        if len(keys) > 0:
-            debug("Unknown ticket IDs: %s" % ', '.join(keys))
+        if len(missing) > 0:
+            debug("Unknown ticket IDs: %s" % ', '.join(missing))
 
-        del csvIn, csvOut
-        return self._save(None)
+        return True
 
     def show(self, args):
-        csvIn = self._initCsvReader(args.inFile)
-        if csvIn == None or not 'key' in csvIn.fieldnames:
+        store = self._initStorage(args.inFile)
+        if store == None or not 'key' in store.fieldnames:
             return False
 
         keys = set()
@@ -455,23 +2039,27 @@ class action():
                 debug("Invalid key id: %s" % key)
 
         # Add keys matching filters
-        keys.update(self._searchKeysFromArg(args))
+        found = self._searchKeysFromArg(args)
+        if found == None:
+            return False
+        keys.update(found)
 
         if args.link:
             ret = True
             if len(keys) > 0:
-                print(jiraUpdate.link(self._conf.jiraURLRoot, list(keys)))
+                print(jiraUpdate.link(self._conf.jiraURLRoot, list(keys)),
+                        file=outStream())
                 return True
             debug("No keys selected, use filter or keys for selection")
             return False
 
-        cols = list(csvIn.fieldnames)
+        cols = list(store.fieldnames)
         cols.remove('key')
         if args.cols is not None:
             cols = args.cols.split(',')
             cols = [i.strip().lower() for i in cols]
 
-        writer = sys.stdout
+        writer = outStream()
         showFct = action._showUser
         if args.ids:
             showFct = action._showId
@@ -479,12 +2067,24 @@ class action():
             writer = self._initCsvWriter(writer, ['key'] + cols)
             showFct = action._showCsv
 
-        for row in csvIn:
-            if row['key'] in keys or args.all:
-                key = row['key']
-                if len(keys) > 0:
-                    keys.remove(key)
-                showFct(row, cols, writer)
+        rows = action._selectRows(store.scan() if args.all
+                else store.select(keys), keys, args.all)
+        if args.sort or args.reverse:
+            rows = self._sortRows(rows, args.sort or 'key', args.reverse,
+                    args.limit)
+            if rows == None:
+                return False
+
+        shown = 0
+        for row in rows:
+            if args.limit > 0 and shown >= args.limit:
+                # The other selected keys are still checked
+                if args.all and len(keys) == 0:
+                    break
+                continue
+            showFct(row, cols, writer)
+            runStats.count('rows')
+            shown += 1
 
         if args.ids:
             writer.write('\n')
@@ -494,6 +2094,159 @@ class action():
 
         return True
 
+    def convert(self, args):
+        store = self._initStorage(args.inFile)
+        if store == None:
+            return False
+
+        if os.path.abspath(args.outFile) == os.path.abspath(store.name):
+            debug("Output database must differ from %s" % store.name)
+            return False
+
+        dbOut = dbStorage.openOutput(args.outFile, store.fieldnames)
+        if dbOut == None:
+            return False
+
+        rowNbr = 0
+        for row in store.rows():
+            rowNbr += 1
+            try:
+                dbOut.writerow(row)
+            except Exception as inst:
+                debug("Fail to write row %d: %s" % (rowNbr, inst))
+                return False
+
+        if not dbOut.commit():
+            return False
+
+        runStats.count('rows', rowNbr)
+        debug("%d rows written in %s" % (rowNbr, args.outFile))
+        return True
+
+    def _readTarget(self, fdIn, outFile=None):
+        target = updateTarget()
+        target.store = self._initStorage(fdIn)
+        if target.store == None:
+            return None
+
+        target.version = target.store.version()
+        target.outName = outFile or fdIn.name
+        target.outFields = conf.mergeFields(target.store.fieldnames)
+        target.dbOut = target.store.openWriter(target.outFields, outFile)
+        if target.dbOut == None:
+            return None
+
+        # Read existing row
+        for rowIn in target.store.rows():
+            target.rowNbr+=1
+            if 'key' not in rowIn or not self._checkKeyFormat(rowIn['key']):
+                debug("Invalid 'key' at %s:%d" % (fdIn.name, target.rowNbr))
+                continue
+
+            target.rows.append(self._initFields(rowIn, target.outFields,
+                self._conf.dateFields))
+            target.rowNbrs.append(target.rowNbr)
+
+        target.state = syncState.load(target.outName + '.sync')
+        return target
+
+    def _writeTarget(self, target):
+        # Rows of the database, the new rows are written by the news
+        for rowOut, rowNbr in zip(target.rows, target.rowNbrs):
+            try:
+                target.dbOut.writerow(rowOut)
+            except Exception as inst:
+                debug("Fail to write csv row %d: %s" % (rowNbr, inst))
+                return False
+        return True
+
+    def _changedRows(self, target):
+        # Updated rows, then the new rows read back from the written database
+        # (only read if the database has a search index)
+        for rowOut, rowUpdated in zip(target.rows, target.isUpdated):
+            if rowUpdated:
+                yield rowOut
+        if len(target.newKeys) <= 0:
+            return
+
+        with open(target.outName, 'r') as fd:
+            store = dbStorage.open(fd, 0, self._conf.keyIndex)
+            if store == None:
+                return
+            try:
+                for row in store.select(set(target.newKeys)):
+                    yield row
+            finally:
+                store.close()
+
+    def _selectRows(rows, keys, selectAll=False):
+        # The first row of each key (removed from keys), or all the rows
+        for row in rows:
+            if row['key'] in keys or selectAll:
+                keys.discard(row['key'])
+                yield row
+
+    def _sortRows(self, rows, cols, reverse=False, limit=0):
+        # Rows sorted by the columns then by key. Only the first rows are
+        # kept with a limit, else runs of sortRows rows sorted in memory are
+        # written in temporary files and merged
+        cols = [i.strip().lower() for i in cols.split(',')]
+        unknown = [col for col in cols if not col in self._store.fieldnames]
+        if len(unknown) > 0:
+            debug("Unknown sort column: %s" % ', '.join(unknown))
+            return None
+
+        dates = self._conf.dateFields
+        def sortKey(row):
+            return tuple(action._keyOrder(row.get(col) or '') if col == 'key'
+                    else action._sortValue(row.get(col), col in dates)
+                    for col in cols) + (action._keyOrder(row['key']),)
+
+        if limit > 0:
+            if reverse:
+                return heapq.nlargest(limit, rows, key=sortKey)
+            return heapq.nsmallest(limit, rows, key=sortKey)
+
+        runs = list()
+        run = list()
+        for row in rows:
+            run.append(row)
+            if len(run) >= self._conf.sortRows:
+                run.sort(key=sortKey, reverse=reverse)
+                runs.append(self._spillRows(run))
+                run = list()
+        run.sort(key=sortKey, reverse=reverse)
+        if len(runs) == 0:
+            return run
+        runStats.count('sortRuns', len(runs) + 1)
+        return heapq.merge(*[self._readRows(fd) for fd in runs], run,
+                key=sortKey, reverse=reverse)
+
+    def _sortValue(value, isDate=False):
+        # Dates, then numbers, then strings
+        if isDate and value and not isinstance(value, dateCSV):
+            value = dateCSV.fromCsv(value)
+        if isinstance(value, dateCSV):
+            return (0, value.date, '')
+        try:
+            return (1, float(value), '')
+        except (TypeError, ValueError):
+            return (2, 0, '' if value == None else str(value))
+
+    def _spillRows(self, rows):
+        fd = tempfile.TemporaryFile(mode='w+', newline='')
+        writer = csv.DictWriter(fd, self._store.fieldnames,
+                extrasaction='ignore')
+        for row in rows:
+            writer.writerow(row)
+        fd.seek(0)
+        return fd
+
+    def _readRows(self, fd):
+        with fd:
+            for row in csv.DictReader(fd, self._store.fieldnames):
+                yield row
+
     def _showId(row, cols, writer):
         key = row.setdefault('key', "NA")
         return writer.write("%s " % key)
@@ -515,18 +2268,48 @@ class action():
 
         writer.write("--\n")
 
-    def _initJiraApi(self):
+    def _initJiraApi(self, args):
         if self._jira == None:
+            cache = jiraCache(self._dbDir(args) + '/' + conf.jiraCacheFile,
+                    conf.jiraCacheSize)
             try:
-                self._jira = jiraUpdate(conf)
+                self._jira = jiraUpdate(conf, cache, offline=args.offline)
             except Exception as inst:
                 debug( "Fail to init JIRA API: %s" % inst)
                 return False
         return True
 
-    def _initFields(self, rowIn, outFields):
-        rowOut = dict.fromkeys(outFields)
-        rowOut.update(rowIn)
+    def _dbDir(self, args):
+        dbDir = os.path.dirname(args.inFile.name)
+        if not dbDir:
+            dbDir = '.'
+        return dbDir
+
+    def _updateIndex(self, rows, version, store=None):
+        # Keep the search index (if any) in sync with the modified rows,
+        # version: database version before the modification
+        store = store or self._store
+        index = searchIndex.open(store.name + searchIndex.ext, self._conf)
+        if index == None:
+            return
+        try:
+            # An outdated index is fully checked by the next search
+            if index.version() == version:
+                index.updateRows(rows)
+                index.setVersion(store.version())
+        except Exception as inst:
+            debug("Fail to update search index: %s" % inst)
+        finally:
+            index.close()
+
+    def _sheetDir(self, args):
+        if hasattr(args, 'sheetDir') and args.sheetDir:
+            return args.sheetDir
+        return self._dbDir(args) + '/sheets'
+
+    def _initFields(self, rowIn, outFields, dates=None):
+        # dates: columns converted in dateCSV
+        rowOut = ticketRow(outFields, rowIn, dates)
         rowOut['key'] = rowOut['key'].strip()
 
         if not rowOut['jiraurl']:
@@ -555,34 +2338,120 @@ class action():
             if len(splitFil) == 2:
                 searchDict.append(tuple(splitFil))
         if len(searchDict) > 0:
-            keys.update(self._searchKeys(searchDict, isOr))
+            keys.update(self._searchKeys(searchDict, isOr,
+                self._sheetDir(args)))
+
+        # The expression restricts the tickets selected by the other filters
+        if getattr(args, 'where', None):
+            expr = filterExpr.compile(args.where)
+            if expr == None:
+                return None
+            candidates = keys if len(searchDict) > 0 else None
+            return self._filterKeys(expr, candidates, self._sheetDir(args))
 
         return keys
 
-    def _searchKeys(self, conditions, isOr=True):
-        foundKeys = set()
-        csvIn = self._resetCsvReader()
+    def _filterKeys(self, expr, candidates=None, sheetDir=None):
+        # Keys of the rows matching the expression, in one pass over the rows
+        # (or over the candidates and the rows found by the indexes)
+        store = self._store
+        manifest = None
+        if (any(f not in store.fieldnames for f in expr.fields)
+                and sheetDir != None and os.path.isdir(sheetDir)):
+            manifest = sheetManifest.open(sheetDir)
+            manifest.scan()
+        match = expr.predicate(store.fieldnames, manifest)
+
+        indexKeys = expr.candidates(store, store.indexedFields())
+        if indexKeys != None:
+            candidates = (indexKeys if candidates == None
+                    else candidates & indexKeys)
+        rows = store.scan() if candidates == None else store.select(candidates)
 
-        if not 'key' in csvIn.fieldnames:
-            return foundKeys
+        keys = set()
+        for row in rows:
+            if row.get('key') and match(row):
+                keys.add(row['key'].strip())
+        return keys
 
-        for row in csvIn:
-            isKeyMatch = False
-            for cond in conditions:
-                k, v = cond
-                isKeyMatch = (k in row and row[k] == v)
-                if isOr and isKeyMatch:
-                    break
-                elif not isOr and not isKeyMatch:
-                    break
+    def _searchKeys(self, conditions, isOr=True, sheetDir=None):
+        # Filters on columns missing in the database match the sheet fields
+        dbConds = [c for c in conditions if c[0] in self._store.fieldnames]
+        sheetConds = [c for c in conditions
+                if not c[0] in self._store.fieldnames]
+        if (len(sheetConds) <= 0 or sheetDir == None
+                or not os.path.isdir(sheetDir)):
+            return self._store.searchKeys(conditions, isOr)
+
+        manifest = sheetManifest.open(sheetDir)
+        manifest.scan()
+        keys = manifest.searchKeys(sheetConds, isOr)
+        if len(dbConds) <= 0:
+            return keys
+        if isOr:
+            return keys | self._store.searchKeys(dbConds, isOr)
+        return keys & self._store.searchKeys(dbConds, isOr)
+
+    def _sortKeys(self, keys, col, store, manifest):
+        # Keys sorted by a column or a sheet field, then by key. Values are
+        # compared as by show --sort (dates, numbers, then strings)
+        col = col.strip().lower()
+        values = dict()
+        if col == 'key':
+            pass
+        elif col in store.fieldnames:
+            values = {row['key'].strip(): row[col]
+                    for row in store.select(keys)}
+        elif manifest != None:
+            values = {key: (manifest.sheet(key) or dict()).get(col)
+                    for key in keys}
+        else:
+            debug("Unknown sort column: %s" % col)
+            return None
 
-            if isKeyMatch:
-                foundKeys.add(row['key'].strip())
+        isDate = col in self._conf.dateFields
+        return sorted(keys, key=lambda k: (action._sortValue(values.get(k),
+            isDate), action._keyOrder(k)))
 
-        self._resetCsvReader()
-        return foundKeys
+    def _keyOrder(key):
+        # LU-99 before LU-100
+        project, sep, number = key.strip().partition('-')
+        return (project, int(number) if number.isdigit() else 0, key)
 
-    def _editSheet(self, key, sheetDir, rowIn, update=True, editor=True):
+    def _renderSheets(self, keys, sheetDir, manifest):
+        # Yield (key, markdown) in the order of keys, markdown is None if
+        # the sheet is not found
+        def render(key):
+            if manifest != None:
+                if not manifest.has(key):
+                    return None
+                return "%s--  \n\n" % sheetObj.format(manifest.sheet(key))
+
+            sheet = sheetObj.open(key, sheetDir, template=False)
+            if sheet is None:
+                return None
+            try:
+                return "%s--  \n\n" % sheet
+            finally:
+                sheet.close()
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self._conf.sheetWorkers) as pool:
+            # Bounded window: sheets are written while the next ones render
+            futures = deque()
+            keys = iter(keys)
+            for key in keys:
+                futures.append((key, pool.submit(render, key)))
+                if len(futures) >= 2 * self._conf.sheetWorkers:
+                    break
+            while len(futures) > 0:
+                key, future = futures.popleft()
+                yield key, future.result()
+                nextKey = next(keys, None)
+                if nextKey != None:
+                    futures.append((nextKey, pool.submit(render, nextKey)))
+
+    def _editSheet(self, key, sheetDir, rowIn, update=True, editor=True):
         ret = True
 
         # Open temp sheet
@@ -647,24 +2516,10 @@ class action():
         p = re.compile('^[ \t]*[A-Z]+-[0-9]+[ \t]*$')
         return p.match(key)
 
-    def _convertCvsDate(self, row):
-        # Convert dates
-        for i in self._conf.dateFields:
-            if i in row and row[i]:
-                row[i] = dateCSV.fromCsv(row[i])
-
     def _initCsvWriter(self, file, fields):
         try:
-            if not file:
-                updateOutPrefix = os.path.basename(__file__) + '.out.'
-                self._files['out'] = tempfile.NamedTemporaryFile(mode='x',
-                        prefix=updateOutPrefix, suffix=".csv")
-            elif hasattr(file, 'write'):
-                self._files['out'] = file
-            else:
-                self._files['out'] = open(file, 'w')
-
-            csvOut = csv.DictWriter(self._files['out'], fields,
+            self._files['out'] = file
+            csvOut = csv.DictWriter(file, fields,
                     quoting=csv.QUOTE_NONNUMERIC)
             csvOut.writeheader()
         except Exception as inst:
@@ -673,102 +2528,1159 @@ class action():
 
         return csvOut
 
-    def _initCsvReader(self, fdIn):
+    def _initStorage(self, fdIn):
+        if self._keepStore and self._store != None:
+            return self._store
+        if self._store != None:
+            # Several databases (update): keep the previous to close it
+            self._stores.append(self._store)
         self._files['in'] = fdIn
-        try:
-            fdIn.seek(0)
-            csvIn = csv.DictReader(fdIn)
-        except Exception as inst:
-            debug("Fail to open CSV input file: %s" % inst)
-            return None
-
-        return csvIn
-
-    def _resetCsvReader(self):
-        fdIn = self._files['in']
-        try:
-            fdIn.seek(0)
-            csvIn = csv.DictReader(fdIn)
-        except Exception as inst:
-            debug("Fail to open CSV input file: %s" % inst)
-            return None
-
-        return csvIn
-
-    def _save(self, outFile):
-        ret = True
-        if not outFile:
-            # user use a temp file
-            try:
-                self._files['in'].close()
-                self._files['out'].flush()
-                shutil.copyfile(self._files['in'].name,
-                        self._files['in'].name + '.old')
-                shutil.copyfile(self._files['out'].name, self._files['in'].name)
-                self._files['out'].close()
-            except Exception as inst:
-                debug("Failed to save %s: %s" % (self._files['in'].name, inst))
-                ret = False
-        return ret
+        self._store = dbStorage.open(fdIn, self._conf.journalSize,
+                self._conf.keyIndex)
+        return self._store
 
     def _clean(self):
         for k, f in self._files.items():
             if f != None:
                 f.close()
+        for store in self._stores + [self._store]:
+            if store != None:
+                store.close()
 
     def __del__(self):
         self._clean()
 
+    def serve(self, args):
+        return trackerDaemon(self, args).run()
+
     funcs = {
+            "serve"  : serve,
             "update" : update,
             "search" : search,
             "mail"   : mail,
             "edit"   : edit,
             "modify" : modify,
+            "convert": convert,
             "show"   : show,
             }
 
-class jiraUpdate():
+class trackerDaemon():
+    # serve command: the database, the sheets and the Jira session stay in
+    # memory. The commands of the clients are run one at a time, received
+    # on <file>.sock as a JSON line {"cwd", "argv"} and answered by a JSON
+    # line {"stdout", "stderr", "status"}
+    ext = '.sock'
+    commands = ['show', 'modify', 'search']
+    webhookEvents = ['jira:issue_updated', 'jira:issue_created']
+    _act = None
+    _jira = None
+    _args = None
+    _path = None
+    _version = None
+    _created = None
+    _lock = None
+    _stop = None
+
+    def __init__(self, act, args):
+        self._act = act
+        self._args = args
+        self._path = os.path.realpath(args.inFile.name)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        act._keepStore = True
+
+    def forward(args, argv):
+        # Result of the command run by the daemon of the database, None if
+        # no daemon serves it
+        path = args.inFile.name + trackerDaemon.ext
+        if (args.no_daemon or not args.action in trackerDaemon.commands
+                or args.profile or args.stats_file
+                or not os.path.exists(path)):
+            return None
+        import socket
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+        except OSError:
+            return None
+
+        try:
+            with sock, sock.makefile('rwb') as fd:
+                fd.write(json.dumps({'cwd': os.getcwd(), 'argv': argv}
+                    ).encode() + b'\n')
+                fd.flush()
+                response = json.loads(fd.readline())
+        except Exception as inst:
+            debug("Fail to run the command by the daemon (%s): %s"
+                    % (path, inst))
+            return False
+
+        sys.stdout.write(response.get('stdout', ''))
+        sys.stderr.write(response.get('stderr', ''))
+        return response.get('status', False)
+
+    def run(self):
+        import signal
+        import socket
+        import socketserver
+
+        path = self._args.inFile.name + self.ext
+        if os.path.exists(path):
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                with sock:
+                    sock.connect(path)
+                debug("A daemon already serves %s (%s)"
+                        % (self._args.inFile.name, path))
+                return False
+            except OSError:
+                # Left by a daemon killed
+                os.unlink(path)
+
+        with self._lock:
+            if not self._refresh():
+                return False
+
+        daemon = self
+        class handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline())
+                    response = daemon.runCommand(request['cwd'],
+                            request['argv'])
+                except Exception as inst:
+                    response = {'stdout': '', 'status': False,
+                            'stderr': "Invalid request: %s\n" % inst}
+                self.wfile.write(json.dumps(response).encode() + b'\n')
+
+        try:
+            server = socketserver.ThreadingUnixStreamServer(path, handler)
+        except OSError as inst:
+            debug("Fail to listen on %s: %s" % (path, inst))
+            return False
+        server.daemon_threads = True
+        # Same access rights as the database
+        os.chmod(path, os.stat(self._path).st_mode & 0o666)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        interval = self._args.interval
+        if interval == None:
+            interval = self._act._conf.serveInterval
+        if interval > 0:
+            threading.Thread(target=self._syncLoop, args=(interval,),
+                    daemon=True).start()
+
+        webhook = None
+        if self._args.webhook:
+            webhook = self._startWebhook(self._args.webhook)
+            if webhook == None:
+                server.server_close()
+                os.unlink(path)
+                return False
+
+        debug("Serve %s on %s" % (self._args.inFile.name, path))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            server.server_close()
+            if webhook != None:
+                webhook.shutdown()
+                webhook.server_close()
+            if os.path.exists(path):
+                os.unlink(path)
+        return True
+
+    def applyWebhook(self, event):
+        # Jira webhook event: the changes of a tracked ticket or a new
+        # ticket matching the news request are applied as by the update
+        issue = event.get('issue')
+        if (not event.get('webhookEvent') in self.webhookEvents
+                or not isinstance(issue, dict) or not 'key' in issue
+                or not isinstance(issue.get('fields'), dict)):
+            return 'ignored'
+
+        key = issue['key']
+        # The result is logged under the lock: the stderr of the daemon is
+        # never mixed with the output of a client command
+        with self._lock:
+            result = self._applyWebhook(issue, event['webhookEvent'])
+            debug("Webhook %s %s: %s" % (event['webhookEvent'], key, result))
+        return result
+
+    def _applyWebhook(self, issue, webhookEvent):
+        key = issue['key']
+        if not self._refresh():
+            return None
+        if self._jira == None:
+            # Only the conversions are used: no Jira connection
+            self._jira = self._act._jira or jiraUpdate(self._act._conf,
+                    offline=True)
+        store = self._act._store
+        version = store.version()
+
+        outFields = conf.mergeFields(store.fieldnames)
+        changes = dict()
+        isKnown = False
+        for rowIn in store.select(set([key])):
+            isKnown = True
+            row = self._act._initFields(rowIn, outFields,
+                    self._act._conf.dateFields)
+            if self._jira.applyIssue(issue, row):
+                changes[key] = trackerDaemon._values(row, store.fieldnames)
+
+        # Same checks as the news of update: criteria of _CreatedJQL,
+        # created after the last entry of the database
+        newRows = list()
+        lastCreated = self._lastCreated(store)
+        if not isKnown and webhookEvent == 'jira:issue_created':
+            dictIssue = self._jira.newIssue(issue)
+            if (dictIssue != None
+                    and self._jira.isCreatedSince(dictIssue, lastCreated)):
+                row = self._act._initFields(dictIssue, outFields)
+                newRows.append(trackerDaemon._values(row,
+                    store.fieldnames))
+                if isinstance(row['created'], dateCSV):
+                    lastCreated = dateCSV(max(lastCreated.date,
+                        row['created'].date))
+
+        if len(changes) == 0 and len(newRows) == 0:
+            return 'ignored'
+        if store.modify(changes, newRows) == None:
+            return None
+        self._act._updateIndex(store.select(set([key])), version)
+        self._version = store.version()
+        self._created = (self._version, lastCreated)
+
+        if len(newRows) > 0:
+            return 'new'
+        return 'updated'
+
+    def _lastCreated(self, store):
+        # Creation date of the last entry in the database, read again only
+        # when the database is changed by another process
+        if self._created != None and self._created[0] == store.version():
+            return self._created[1]
+        lastCreated = dateCSV(datetime(1900,1,1, tzinfo=timezone.utc))
+        for row in store.scan():
+            created = dateCSV.fromCsv(row.get('created') or '')
+            if isinstance(created, dateCSV):
+                lastCreated = dateCSV(max(lastCreated.date, created.date))
+        self._created = (store.version(), lastCreated)
+        return lastCreated
+
+    def _values(row, fields):
+        # Column strings of a row, as written in the database
+        return {f: "" if row.get(f) is None else str(row.get(f))
+                for f in fields}
+
+    def _startWebhook(self, address):
+        from http.server import BaseHTTPRequestHandler
+        from http.server import ThreadingHTTPServer
+
+        host, sep, port = address.rpartition(':')
+        daemon = self
+        class handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, result):
+                body = json.dumps({'result': result}).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    event = json.loads(self.rfile.read(length))
+                    if not isinstance(event, dict):
+                        raise ValueError("JSON object expected")
+                except Exception as inst:
+                    debug("Invalid webhook request: %s" % inst)
+                    return self._send(400, 'invalid')
+
+                try:
+                    result = daemon.applyWebhook(event)
+                except Exception as inst:
+                    debug("Fail to apply webhook: %s" % inst)
+                    result = None
+                if result == None:
+                    return self._send(500, 'failed')
+                self._send(200, result)
+
+        try:
+            server = ThreadingHTTPServer((host or '127.0.0.1', int(port)),
+                    handler)
+        except (OSError, ValueError) as inst:
+            debug("Fail to listen for webhooks on %s: %s" % (address, inst))
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        debug("Receive Jira webhooks on %s:%d" % server.server_address[:2])
+        return server
+
+    def runCommand(self, cwd, argv):
+        # The output of the command goes to the streams of this thread only
+        threadOutput.stdout = io.StringIO()
+        threadOutput.stderr = io.StringIO()
+        status = False
+        with self._lock:
+            try:
+                args = parseArgs(argv, cwd)
+                args.inFile.close()
+                if not args.action in self.commands:
+                    debug("Command not served by the daemon: %s" % args.action)
+                elif args.profile or args.stats_file:
+                    # Files of the client, written by its own process
+                    debug("Options --profile and --stats-file not served by "
+                            + "the daemon, use --no-daemon")
+                elif os.path.realpath(args.inFile.name) != self._path:
+                    debug("Database not served by the daemon: %s"
+                            % args.inFile.name)
+                elif self._refresh():
+                    status = self._act.runAction(args)
+                    if self._act._store != None:
+                        self._version = self._act._store.version()
+            except SystemExit as inst:
+                # argparse errors and help
+                status = inst.code in [0, None]
+            except Exception as inst:
+                debug("Command failed: %s" % inst)
+
+        response = {'stdout': threadOutput.stdout.getvalue(),
+                'stderr': threadOutput.stderr.getvalue(),
+                'status': bool(status)}
+        threadOutput.stdout = None
+        threadOutput.stderr = None
+        return response
+
+    def _refresh(self):
+        # Reload the database changed by another process, check the sheet
+        # directories again
+        sheetManifest.invalidateAll()
+        store = self._act._store
+        if store != None and store.version() == self._version:
+            return True
+        if store != None:
+            store.close()
+            self._act._store = None
+
+        try:
+            store = self._act._initStorage(open(self._path, 'r'))
+        except Exception as inst:
+            debug("Fail to open %s: %s" % (self._path, inst))
+            return False
+        if store == None:
+            return False
+        # Parse the whole file now
+        store.rows()
+        self._version = store.version()
+        return True
+
+    def _syncLoop(self, interval):
+        while not self._stop.wait(interval):
+            self.sync()
+
+    def sync(self):
+        argv = [self._path, 'update']
+        if self._args.no_news:
+            argv.append('--no-news')
+        if self._args.offline:
+            argv.append('--offline')
+
+        with self._lock:
+            args = None
+            try:
+                if not self._refresh():
+                    return False
+                args = parseArgs(argv)
+                return self._act.runAction(args)
+            except Exception as inst:
+                debug("Jira synchronization failed: %s" % inst)
+                return False
+            finally:
+                if args != None:
+                    args.inFile.close()
+                # The database is written by the update: read it again
+                if self._act._store != None:
+                    self._act._store.close()
+                    self._act._store = None
+
+class circuitOpenError(Exception):
+    pass
+
+class requestScheduler():
     _conf = None
+    _lock = None
+    _cond = None
+    # Token bucket
+    _tokens = 0
+    _lastRefill = 0
+    _pauseUntil = 0
+    # Adaptive concurrency
+    _limit = 1
+    _inFlight = 0
+    _successes = 0
+    _latency = None
+    # Circuit breaker
+    _failures = 0
+    _openUntil = 0
+    _isTrial = False
+    # Time functions, replaced by the tests
+    _clock = None
+    _sleep = None
+
+    def __init__(self, conf, clock=time.monotonic, sleep=time.sleep):
+        self._conf = conf
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._tokens = conf.jiraBurst
+        self._lastRefill = self._clock()
+        self._limit = conf.jiraWorkers
+
+    def run(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            isTrial = self._acquire()
+            start = self._clock()
+            try:
+                ret = func(*args, **kwargs)
+            except Exception as inst:
+                delay = self._retryDelay(inst, attempt)
+                self._release(self._clock() - start,
+                        failure=(delay != None), isTrial=isTrial)
+                if delay == None or attempt >= self._conf.jiraRetries:
+                    raise
+                debug("Jira request retry in %.1fs (%d/%d): %s"
+                        % (delay, attempt + 1, self._conf.jiraRetries,
+                            requestScheduler._errorStr(inst)))
+                self._sleep(delay)
+                attempt += 1
+                continue
+
+            self._release(self._clock() - start, isTrial=isTrial)
+            return ret
+
+    def _acquire(self):
+        # True if the request is the trial of the half-open circuit
+        with self._cond:
+            while True:
+                now = self._clock()
+                wait = self._checkCircuit(now)
+
+                # Concurrency slot
+                if wait == None and self._inFlight >= self._limit:
+                    self._cond.wait()
+                    continue
+
+                # Server asked to slow down (Retry-After)
+                if wait == None and self._pauseUntil > now:
+                    wait = self._pauseUntil - now
+
+                # Token bucket
+                if wait == None:
+                    self._tokens = min(self._conf.jiraBurst, self._tokens
+                            + (now - self._lastRefill) * self._conf.jiraRate)
+                    self._lastRefill = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._inFlight += 1
+                        # Admitted while half-open: this is the trial request
+                        if self._failures >= self._conf.jiraBreakerErrors:
+                            self._isTrial = True
+                            return True
+                        return False
+                    wait = (1 - self._tokens) / self._conf.jiraRate
+
+                self._cond.wait(wait)
+
+    def _checkCircuit(self, now):
+        if self._failures < self._conf.jiraBreakerErrors:
+            return None
+
+        if self._openUntil > now:
+            raise circuitOpenError("Jira requests suspended for %ds"
+                    % (self._openUntil - now))
+
+        # Half-open: let only one trial request go, the flag is set when
+        # the trial is admitted (it can still wait for a pause or a slot)
+        if self._isTrial:
+            return self._conf.jiraBreakerDelay
+        return None
+
+    def _release(self, latency, failure=False, isTrial=False):
+        with self._cond:
+            self._inFlight -= 1
+            if isTrial:
+                self._isTrial = False
+                if failure:
+                    self._openUntil = (self._clock()
+                            + self._conf.jiraBreakerDelay)
+                    debug("Jira still unavailable, requests suspended for %ds"
+                            % self._conf.jiraBreakerDelay)
+                else:
+                    debug("Jira available, requests resumed")
+
+            if failure:
+                self._failures += 1
+                if self._failures == self._conf.jiraBreakerErrors:
+                    self._openUntil = (self._clock()
+                            + self._conf.jiraBreakerDelay)
+                    debug("Too many Jira failures, requests suspended for %ds"
+                            % self._conf.jiraBreakerDelay)
+                self._setLimit(self._limit // 2)
+            else:
+                self._failures = 0
+                self._updateLatency(latency)
+
+            self._cond.notify_all()
+
+    def _updateLatency(self, latency):
+        if self._latency == None:
+            self._latency = latency
+        self._latency = 0.8 * self._latency + 0.2 * latency
+
+        # Additive increase after a full window of successes
+        if self._latency > self._conf.jiraLatency:
+            self._successes = 0
+            self._setLimit(self._limit - 1)
+        else:
+            self._successes += 1
+            if self._successes >= self._limit:
+                self._successes = 0
+                self._setLimit(self._limit + 1)
+
+    def _setLimit(self, limit):
+        limit = max(1, min(limit, self._conf.jiraWorkers))
+        if limit != self._limit:
+            debug("Jira concurrency limit: %d -> %d" % (self._limit, limit))
+            self._limit = limit
+
+    def _retryDelay(self, inst, attempt):
+        status = getattr(inst, 'status_code', None)
+        # Connection errors and timeouts are OSError
+        if status not in [429, 500, 502, 503, 504] and (status != None
+                or not isinstance(inst, OSError)):
+            return None
+
+        delay = min(self._conf.jiraMaxBackoff,
+                self._conf.jiraBackoff * 2 ** attempt)
+        delay *= random.uniform(0.5, 1)
+
+        retryAfter = requestScheduler._retryAfter(inst)
+        if retryAfter != None:
+            delay = max(delay, min(retryAfter, self._conf.jiraMaxBackoff))
+            with self._lock:
+                self._pauseUntil = max(self._pauseUntil,
+                        self._clock() + delay)
+
+        return delay
+
+    def _retryAfter(inst):
+        headers = getattr(getattr(inst, 'response', None), 'headers', None)
+        if headers == None:
+            headers = getattr(inst, 'headers', None)
+        if headers == None:
+            return None
+
+        value = headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            import email.utils
+            date = email.utils.parsedate_to_datetime(value)
+            return max(0, (date - datetime.now(timezone.utc)).total_seconds())
+        except Exception:
+            return None
+
+    def _errorStr(inst):
+        status = getattr(inst, 'status_code', None)
+        if status != None:
+            return "HTTP %d" % status
+        return str(inst)
+
+class syncState():
+    # Sidecar of a CSV database with the state of the last update
+    lastSync = None
+    serverOffset = 0
+    keys = None
+
+    def __init__(self):
+        self.keys = set()
+
+    def load(path):
+        state = syncState()
+        try:
+            with open(path, 'r') as fd:
+                data = json.load(fd)
+            state.lastSync = dateCSV.fromCsv(data['lastSync'])
+            if not isinstance(state.lastSync, dateCSV):
+                state.lastSync = None
+            state.serverOffset = float(data.get('serverOffset', 0))
+            state.keys = set(data.get('keys', list()))
+        except FileNotFoundError:
+            pass
+        except Exception as inst:
+            debug("Ignore invalid sync state %s: %s" % (path, inst))
+            state = syncState()
+
+        return state
+
+    def merge(states, keySets):
+        # State of several databases (keySets: tracked keys of each
+        # database): a ticket is known if every database tracking it
+        # synchronized it, since the oldest synchronization
+        ret = syncState()
+        dates = [state.lastSync for state in states if state.lastSync != None]
+        if len(dates) == 0:
+            return ret
+        ret.lastSync = min(dates, key=lambda date: date.date)
+        ret.serverOffset = states[0].serverOffset
+
+        unknown = set()
+        for state, keys in zip(states, keySets):
+            ret.keys |= keys
+            if state.lastSync == None:
+                unknown |= keys
+            else:
+                unknown |= keys - state.keys
+        ret.keys -= unknown
+        return ret
+
+    def update(self, syncStart, keys):
+        # Keep a margin for the tickets updated during the sync
+        self.lastSync = dateCSV(syncStart.date - timedelta(0,60))
+        self.keys = set(keys)
+
+    def save(self, path):
+        data = {
+                'lastSync': str(self.lastSync),
+                'serverOffset': self.serverOffset,
+                'keys': sorted(self.keys),
+                }
+        try:
+            with open(path, 'w') as fd:
+                json.dump(data, fd, indent=1)
+        except Exception as inst:
+            debug("Failed to save sync state %s: %s" % (path, inst))
+            return False
+        return True
+
+class updateTarget():
+    # Database of an update: rows read, changes and output
+    store = None
+    version = None
+    outName = None
+    outFields = None
+    dbOut = None
+    state = None
+    rowNbr = 1
+    rows = None
+    rowNbrs = None
+    isUpdated = None
+    updatedKeys = None
+    newKeys = None
+    lastCreated = None
+
+    def __init__(self):
+        self.rows = list()
+        self.rowNbrs = list()
+        self.updatedKeys = list()
+        self.newKeys = list()
+        self.lastCreated = dateCSV(datetime(1900,1,1, tzinfo=timezone.utc))
+
+class jiraCache():
+    # Raw Jira issues by field set and key, with the fetch time
+    _path = None
+    _size = 0
+    _lock = None
+    _issues = None
+    _queries = None
+
+    def __init__(self, path, size):
+        self._path = path
+        self._size = size
+        self._lock = threading.Lock()
+        self._issues = dict()
+        self._queries = dict()
+
+        if path == None or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as fd:
+                data = json.load(fd)
+            self._issues = data['issues']
+            self._queries = data['queries']
+        except Exception as inst:
+            debug("Ignore invalid Jira cache %s: %s" % (path, inst))
+
+    def getIssue(self, key, fields, maxAge=None):
+        with self._lock:
+            entry = self._issues.get(fields, dict()).get(key)
+            if entry == None or not self._isFresh(entry, maxAge):
+                return None
+            entry['used'] = time.time()
+            return entry
+
+    def putIssue(self, issue, fields):
+        now = time.time()
+        entry = {
+                'issue': issue,
+                'updated': issue['fields'].get('updated'),
+                'fetched': now,
+                'used': now,
+                }
+        with self._lock:
+            self._issues.setdefault(fields, dict())[issue['key']] = entry
+
+    def getQuery(self, jql, fields, maxAge=None):
+        with self._lock:
+            entry = self._queries.get(fields + ':' + jql)
+            if entry == None or not self._isFresh(entry, maxAge):
+                return None
+        issueArr = list()
+        for key in entry['keys']:
+            issueEntry = self.getIssue(key, fields)
+            if issueEntry == None:
+                return None
+            issueArr.append(issueEntry['issue'])
+        return issueArr
+
+    def putQuery(self, jql, fields, keys):
+        with self._lock:
+            self._queries[fields + ':' + jql] = {
+                    'keys': keys,
+                    'fetched': time.time(),
+                    }
+
+    def save(self):
+        if self._path == None:
+            return True
+
+        with self._lock:
+            self._evict()
+            data = {'issues': self._issues, 'queries': self._queries}
+            try:
+                fd = tempfile.NamedTemporaryFile(mode='w', delete=False,
+                        dir=os.path.dirname(self._path) or '.',
+                        prefix=os.path.basename(self._path))
+                with fd:
+                    json.dump(data, fd)
+                os.replace(fd.name, self._path)
+            except Exception as inst:
+                debug("Failed to save Jira cache %s: %s" % (self._path, inst))
+                return False
+        return True
+
+    def _isFresh(self, entry, maxAge):
+        return maxAge == None or time.time() - entry['fetched'] <= maxAge
+
+    def _evict(self):
+        # Least recently used issues first
+        entries = [(entry['used'], fields, key)
+                for fields, issues in self._issues.items()
+                for key, entry in issues.items()]
+        if len(entries) > self._size:
+            entries.sort()
+            for used, fields, key in entries[:len(entries) - self._size]:
+                del self._issues[fields][key]
+
+        # Only keep queries with all their issues
+        for queryKey in list(self._queries.keys()):
+            fields = queryKey.split(':', 1)[0]
+            issues = self._issues.get(fields, dict())
+            if any(key not in issues for key in self._queries[queryKey]['keys']):
+                del self._queries[queryKey]
+
+class jiraTransport():
+    # Jira REST requests with the jira python module
     _jiraApi = None
+
+    def __init__(self, conf):
+        from jira import JIRA
+        # Retries are handled by the scheduler
+        self._jiraApi = JIRA(conf.jiraURLRoot,
+                max_retries=0, timeout=conf.jiraTimeout)
+
+    def serverInfo(self):
+        return self._jiraApi.server_info()
+
+    def issue(self, key, fields):
+        return self._jiraApi.issue(key, fields=fields).raw
+
+    def search(self, jql, startAt, maxResults, fields):
+        # validate_query=False: unknown keys are not an error
+        return self._jiraApi.search_issues(jql, startAt=startAt,
+                maxResults=maxResults, validate_query=False, fields=fields,
+                json_result=True)
+
+class httpError(Exception):
+    status_code = None
+    headers = None
+
+    def __init__(self, status, headers, text):
+        super().__init__("HTTP %d: %s" % (status, text[:200]))
+        self.status_code = status
+        self.headers = headers
+
+class asyncTransport():
+    # Jira REST requests with asyncio and a pool of keep-alive connections
+    _conf = None
+    _host = None
+    _port = None
+    _ssl = None
+    _prefix = None
+    _loop = None
+    _idle = None
+    _slots = None
+
+    def __init__(self, conf):
+        import asyncio
+        import ssl
+        self._conf = conf
+        url = urllib.parse.urlsplit(conf.jiraURLRoot)
+        self._host = url.hostname
+        self._prefix = url.path.rstrip('/')
+        if url.scheme == 'https':
+            self._ssl = ssl.create_default_context()
+            self._port = url.port or 443
+        else:
+            self._port = url.port or 80
+
+        # The event loop runs in its own thread, requests come from workers
+        self._idle = list()
+        self._loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        thread.start()
+
+    def serverInfo(self):
+        return self._get('/rest/api/2/serverInfo')
+
+    def issue(self, key, fields):
+        return self._get('/rest/api/2/issue/' + urllib.parse.quote(key),
+                {'fields': fields})
+
+    def search(self, jql, startAt, maxResults, fields):
+        return self._get('/rest/api/2/search', {
+            'jql': jql,
+            'startAt': startAt,
+            'maxResults': maxResults,
+            'validateQuery': 'false',
+            'fields': fields,
+            })
+
+    def _get(self, path, params=None):
+        target = self._prefix + path
+        if params:
+            target += '?' + urllib.parse.urlencode(params)
+        import asyncio
+        future = asyncio.run_coroutine_threadsafe(self._fetch(target),
+                self._loop)
+        return future.result()
+
+    async def _fetch(self, target):
+        import asyncio
+        try:
+            status, headers, body = await asyncio.wait_for(
+                    self._fetchPooled(target), self._conf.jiraTimeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Jira request timeout (%s)" % target)
+
+        text = body.decode('utf-8', 'replace')
+        if status != 200:
+            raise httpError(status, headers, text)
+        return json.loads(text)
+
+    async def _fetchPooled(self, target):
+        import asyncio
+        if self._slots == None:
+            self._slots = asyncio.Semaphore(self._conf.jiraWorkers)
+
+        async with self._slots:
+            while len(self._idle) > 0:
+                # Server may have closed an idle connection: retry on a new one
+                conn = self._idle.pop()
+                try:
+                    return await self._send(conn, target)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    continue
+
+            conn = await asyncio.open_connection(self._host, self._port,
+                    ssl=self._ssl)
+            return await self._send(conn, target)
+
+    async def _send(self, conn, target):
+        import email.parser
+        import http.client
+        reader, writer = conn
+        try:
+            writer.write(("GET %s HTTP/1.1\r\n"
+                    "Host: %s\r\n"
+                    "Accept: application/json\r\n"
+                    "Connection: keep-alive\r\n\r\n"
+                    % (target, self._host)).encode('latin-1'))
+            await writer.drain()
+
+            statusLine = await reader.readline()
+            if not statusLine:
+                raise ConnectionError("Connection closed by Jira server")
+            version, status = statusLine.decode('latin-1').split()[:2]
+
+            headerLines = list()
+            while True:
+                line = await reader.readline()
+                if line in [b'\r\n', b'\n', b'']:
+                    break
+                headerLines.append(line)
+            headers = email.parser.BytesParser(
+                    _class=http.client.HTTPMessage).parsebytes(
+                            b''.join(headerLines))
+
+            isKeepAlive = (version == 'HTTP/1.1'
+                    and headers.get('Connection', '').lower() != 'close')
+            if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+                body = await self._readChunks(reader)
+            elif headers.get('Content-Length') != None:
+                body = await reader.readexactly(
+                        int(headers.get('Content-Length')))
+            else:
+                body = await reader.read()
+                isKeepAlive = False
+        except BaseException:
+            writer.close()
+            raise
+
+        if isKeepAlive:
+            self._idle.append(conn)
+        else:
+            writer.close()
+
+        return int(status), headers, body
+
+    async def _readChunks(self, reader):
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # Trailers
+                while (await reader.readline()) not in [b'\r\n', b'\n', b'']:
+                    pass
+                return bytes(body)
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+
+class jiraUpdate():
+    _conf = None
+    _lock = None
+    _sessions = None
+    _transport = None
+    _pages = None
+    _sched = None
+    _cache = None
+    _offline = False
+    _cacheOldest = None
+    failedKeys = None
     _UpdatedJQL = 'key = "%s" AND updated > "%s" '
-    _CreatedJQL = ('type = Bug '
-            + 'AND priority > Minor '
-            + 'AND project = Lustre '
+    _BatchJQL = 'key in (%s)'
+    _SinceJQL = ' AND updated >= "%s"'
+    _ProjectJQL = 'project in (%s)' + _SinceJQL
+    # Criteria of the new tickets, requested by _CreatedJQL and checked on
+    # the issues pushed by Jira (newIssue)
+    _CreatedType = 'Bug'
+    _Priorities = ['Blocker', 'Critical', 'Major', 'Minor', 'Trivial']
+    _CreatedPriority = 'Minor'
+    _CreatedProject = 'Lustre'
+    _CreatedVersion = '*Lustre 2.12*'
+    _CreatedJQL = ('type = %s ' % _CreatedType
+            + 'AND priority > %s ' % _CreatedPriority
+            + 'AND project = %s ' % _CreatedProject
             + 'AND created >= "%s" '
-            + 'AND (affectedVersion ~ "*Lustre 2.12*" '
+            + 'AND (affectedVersion ~ "%s" ' % _CreatedVersion
             +       'OR affectedVersion is EMPTY) '
             + 'ORDER BY created DESC')
 
-    def __init__(self, conf):
+    def __init__(self, conf, cache=None, offline=False):
         self._conf = conf
-        self._jiraApi = JIRA(conf.jiraURLRoot)
+        self._lock = threading.Lock()
+        self._sessions = list()
+        self._sched = requestScheduler(conf)
+        self._cache = cache
+        if cache == None:
+            self._cache = jiraCache(None, conf.jiraCacheSize)
+        self._offline = offline
+        self.failedKeys = list()
+        from concurrent.futures import ThreadPoolExecutor
+        self._pages = ThreadPoolExecutor(max_workers=conf.jiraWorkers)
+        if offline:
+            return
+
+        if conf.jiraTransport == 'asyncio':
+            self._transport = asyncTransport(conf)
+        self._releaseApi(self._sched.run(self._acquireApi))
+
+    def reset(self):
+        # New update with the same Jira sessions (serve command)
+        self.failedKeys = list()
+        self._cacheOldest = None
+
+    def _acquireApi(self):
+        # Shared pool of connections or an idle Jira session, kept for the
+        # next requests
+        if self._transport != None:
+            return self._transport
+        with self._lock:
+            if len(self._sessions) > 0:
+                return self._sessions.pop()
+        return jiraTransport(self._conf)
+
+    def _releaseApi(self, api):
+        if api is self._transport:
+            return
+        with self._lock:
+            self._sessions.append(api)
+
+    def _request(self, funcName, *args, **kwargs):
+        kind = self._requestKind(funcName, args)
+        return self._sched.run(self._timedRequest, kind, funcName, *args,
+                **kwargs)
+
+    def _timedRequest(self, kind, funcName, *args, **kwargs):
+        api = self._acquireApi()
+        start = time.monotonic()
+        try:
+            ret = getattr(api, funcName)(*args, **kwargs)
+        except Exception:
+            runStats.request(kind, time.monotonic() - start, failed=True)
+            raise
+        finally:
+            self._releaseApi(api)
+        runStats.request(kind, time.monotonic() - start)
+        return ret
+
+    def _requestKind(self, funcName, args):
+        # Statistics by JQL template: _UpdatedJQL, _CreatedJQL...
+        if funcName != 'search':
+            return funcName
+        for name in ['_UpdatedJQL', '_CreatedJQL', '_BatchJQL', '_ProjectJQL']:
+            if args[0].startswith(getattr(self, name).split('%')[0]):
+                return name[1:]
+        return 'search'
 
     def update(self, row, force=False):
         issueArr = list()
         ret = False
         cmd = None
         fields = ','.join(self._conf.jiraFields)
+        isTracked = (row['trackstate'] in ['Follow', 'Updated']
+                and isinstance(row['updated'], dateCSV))
+
+        if not force and not isTracked:
+            return ret
+
+        issue = self._getCache(row['key'], fields)
+        if issue != None:
+            return self._applyIssue(issue, row,
+                    'changed' if force else 'newer')
 
         try:
-            if force:
+            if self._offline:
+                self.failedKeys.append(row['key'])
+            elif force:
                 cmd = row['key']
-                issueArr.append(self._jiraApi.issue( cmd,
-                    fields=fields));
+                issueArr.append(self._request('issue', cmd, fields));
+                self._cache.putIssue(issueArr[0], fields)
 
-            elif (row['trackstate'] in ['Follow', 'Updated']
-                    and isinstance(row['updated'], dateCSV)):
+            else:
                 date = dateCSV(row['updated'].date + timedelta(0,60))
                 cmd = self._UpdatedJQL % (row['key'], date)
-                issueArr = self._jiraApi.search_issues( cmd, maxResults=1,
-                        fields=fields);
+                issueArr = self._request('search', cmd, 0, 1,
+                        fields)['issues'];
         except Exception as inst:
             debug('JIRA request fail (cmd="%s"): %s' % (cmd, inst))
+            if getattr(inst, 'status_code', None) != 404:
+                self.failedKeys.append(row['key'])
 
         if len(issueArr) > 0:
-            self._updateDict(issueArr[0], row)
-            row['trackstate'] = 'Updated'
-            ret = True
+            ret = self._applyIssue(issueArr[0], row)
+
+        return ret
+
+    def serverTime(self, state):
+        # Jira local time, JQL dates are compared with it
+        localNow = datetime.now(timezone.utc).replace(tzinfo=None)
+        serverNow = None
+        try:
+            if not self._offline:
+                info = self._request('serverInfo')
+                serverNow = dateCSV.fromJira(info['serverTime']).date
+                serverNow = serverNow.replace(tzinfo=None)
+                state.serverOffset = (serverNow - localNow).total_seconds()
+        except Exception as inst:
+            debug("Unable to get Jira server time: %s" % inst)
+            serverNow = None
+
+        if serverNow == None:
+            serverNow = localNow + timedelta(0, state.serverOffset)
+
+        return dateCSV(serverNow.replace(tzinfo=timezone.utc))
+
+    def updateRows(self, rows, force=False, state=None):
+        ret = [False] * len(rows)
+        rowsByKey = OrderedDict()
+        fields = ','.join(self._conf.jiraFields)
+
+        # Select rows to sync
+        for idx, row in enumerate(rows):
+            if (force or (row['trackstate'] in ['Follow', 'Updated']
+                    and isinstance(row['updated'], dateCSV))):
+                rowsByKey.setdefault(row['key'], list()).append(idx)
+
+        fallback = list()
+        check = None if force else 'newer'
+
+        # Serve recent tickets from the cache
+        rowsByKey = self._applyCache(rows, rowsByKey, fields, force, ret)
+        if self._offline:
+            self.failedKeys.extend(rowsByKey.keys())
+            return ret
+
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures import as_completed
+        with ThreadPoolExecutor(max_workers=self._conf.jiraWorkers) as pool:
+            if force:
+                rowsByKey = self._probeRows(pool, rows, rowsByKey)
+            elif state != None and state.lastSync != None:
+                issueArr, otherRows = self._searchChanged(pool, rowsByKey,
+                        state.keys, state.lastSync, fields)
+                self._applyIssues(issueArr, rows, rowsByKey, check, ret)
+                rowsByKey = otherRows
+
+            # Rows are modified in place: completion order does not matter
+            for batchKeys, issueArr in self._searchBatches(pool,
+                    list(rowsByKey.keys()), fields):
+                if issueArr == None:
+                    # Fallback on per-row requests (ex: JQL refused by server)
+                    for key in batchKeys:
+                        fallback.extend(rowsByKey[key])
+                    continue
+
+                self._applyIssues(issueArr, rows, rowsByKey, check, ret)
+
+            futures = {pool.submit(self.update, rows[idx], force): idx
+                    for idx in fallback}
+            for future in as_completed(futures):
+                ret[futures[future]] = future.result()
 
         return ret
 
@@ -777,23 +3689,86 @@ class jiraUpdate():
         jql = self._CreatedJQL % date
         return self.search(jql)
 
+    def applyIssue(self, issue, row):
+        # Issue pushed by Jira (webhook): applied to a tracked row as by
+        # updateRows
+        if (not row['trackstate'] in ['Follow', 'Updated']
+                or not isinstance(row['updated'], dateCSV)):
+            return False
+        return self._applyIssue(issue, row, 'newer')
+
+    def newIssue(self, issue):
+        # Fields of an issue pushed by Jira (webhook) as returned by news,
+        # None if it does not match _CreatedJQL
+        import fnmatch
+        fields = issue.get('fields') or dict()
+        def name(value):
+            if isinstance(value, dict):
+                return value.get('name', value.get('value'))
+            return value
+
+        project = fields.get('project') or dict()
+        versions = [name(v) or '' for v in fields.get('versions') or list()]
+        # priority > _CreatedPriority: the priorities listed before it
+        priorities = self._Priorities[:self._Priorities.index(
+            self._CreatedPriority)]
+        if (name(fields.get('issuetype')) != self._CreatedType
+                or not name(fields.get('priority')) in priorities
+                or not self._CreatedProject in [project.get('name'),
+                    project.get('key')]
+                or (len(versions) > 0 and not any(fnmatch.fnmatch(v.lower(),
+                    self._CreatedVersion.lower()) for v in versions))):
+            return None
+
+        dictIssue = {'key' : issue['key']}
+        self._updateDict(issue, dictIssue)
+        return dictIssue
+
+    def isCreatedSince(self, row, lastCreatedDate):
+        # Same check as _CreatedJQL, done locally
+        if not isinstance(row.get('created'), dateCSV):
+            return True
+        date = lastCreatedDate.date + timedelta(0,60)
+        created = row['created'].date.replace(second=0, microsecond=0)
+        return created.replace(tzinfo=None) >= date.replace(second=0,
+                microsecond=0, tzinfo=None)
+
     def search(self, jql):
-        issueArr = list()
-        retArr = list()
+        # Generator: rows are converted page by page
         fields = ','.join(self._conf.jiraFields)
+        keys = list()
+
+        issueArr = self._cache.getQuery(jql, fields, self._cacheAge())
+        if issueArr == None and self._offline:
+            debug('No cached result for jql="%s"' % jql)
+            return
+        elif issueArr != None:
+            debug('Use cached result for jql="%s"' % jql)
+        else:
+            issueArr = self._iterPages(jql, fields)
 
         try:
-            issueArr = self._jiraApi.search_issues( jql, maxResults=50000,
-                    fields=fields);
+            for issue in issueArr:
+                dictIssue = {'key' : issue['key']}
+                self._updateDict(issue, dictIssue)
+                keys.append(issue['key'])
+                yield dictIssue
         except Exception as inst:
             debug('JIRA request fail (jql="%s"): %s' % (jql, inst))
+            return
 
-        for issue in issueArr:
-            dictIssue = {'key' : issue.key}
-            self._updateDict(issue, dictIssue)
-            retArr.append(dictIssue)
+        self._cache.putQuery(jql, fields, keys)
 
-        return retArr
+    def saveCache(self):
+        return self._cache.save()
+
+    def cacheTime(self, state):
+        # Server time of the oldest cached response used
+        if self._cacheOldest == None:
+            return None
+        date = (datetime.fromtimestamp(self._cacheOldest, timezone.utc)
+                + timedelta(0, state.serverOffset))
+        return dateCSV(date)
 
     def link(urlRoot, issueIds):
         link = ''
@@ -808,18 +3783,567 @@ class jiraUpdate():
 
         return link
 
-    def _updateDict(self, jiraObj, dict2Up):
+    def _applyIssues(self, issueArr, rows, rowsByKey, check, ret):
+        for issue in issueArr:
+            for idx in rowsByKey.get(issue['key'], list()):
+                if self._applyIssue(issue, rows[idx], check):
+                    ret[idx] = True
+
+    def _applyIssue(self, issue, row, check=None):
+        # check: None (always), 'newer' (_UpdatedJQL) or 'changed' (probe)
+        if check == 'newer' and not self._isNewer(issue, row['updated']):
+            return False
+        if (check == 'changed' and self._isComplete(row)
+                and not self._isChanged(issue, row['updated'])):
+            return False
+
+        self._updateDict(issue, row)
+        row['trackstate'] = 'Updated'
+        return True
+
+    def _applyCache(self, rows, rowsByKey, fields, force, ret):
+        otherRows = OrderedDict()
+        for key, idxs in rowsByKey.items():
+            issue = self._getCache(key, fields)
+            if issue == None:
+                otherRows[key] = idxs
+                continue
+            for idx in idxs:
+                if self._applyIssue(issue, rows[idx],
+                        'changed' if force else 'newer'):
+                    ret[idx] = True
+
+        if len(otherRows) < len(rowsByKey):
+            debug("%d/%d tickets found in cache"
+                    % (len(rowsByKey) - len(otherRows), len(rowsByKey)))
+        return otherRows
+
+    def _getCache(self, key, fields):
+        entry = self._cache.getIssue(key, fields, self._cacheAge())
+        if entry == None:
+            return None
+        runStats.count('cacheHits')
+
+        if self._cacheOldest == None or entry['fetched'] < self._cacheOldest:
+            self._cacheOldest = entry['fetched']
+        return entry['issue']
+
+    def _cacheAge(self):
+        # Offline: any cached response is used
+        if self._offline:
+            return None
+        return self._conf.jiraCacheTTL
+
+    def _searchChanged(self, pool, rowsByKey, syncKeys, lastSync, fields):
+        # Keys synchronized at the last sync only need tickets updated since
+        knownKeys = list()
+        otherRows = OrderedDict()
+        for key, idxs in rowsByKey.items():
+            if key in syncKeys:
+                knownKeys.append(key)
+            else:
+                otherRows[key] = idxs
+
+        issueArr = list()
+        if len(knownKeys) > self._conf.jiraBatchSize:
+            # One request for all the projects, filtered locally
+            projects = sorted(set(key.split('-')[0] for key in knownKeys))
+            jql = self._ProjectJQL % (','.join(projects), lastSync)
+            try:
+                issueArr = [issue for issue in self._iterPages(jql, fields)
+                        if issue['key'] in rowsByKey]
+            except Exception as inst:
+                debug('JIRA request fail (jql="%s"): %s' % (jql, inst))
+                if isinstance(inst, (circuitOpenError, OSError)):
+                    self.failedKeys.extend(knownKeys)
+                else:
+                    otherRows.update((key, rowsByKey[key]) for key in knownKeys)
+        else:
+            for batchKeys, batchArr in self._searchBatches(pool, knownKeys,
+                    fields, since=lastSync):
+                if batchArr == None:
+                    otherRows.update((key, rowsByKey[key]) for key in batchKeys)
+                else:
+                    issueArr.extend(batchArr)
+
+        debug("%d tickets updated since %s, %d tickets not synchronized yet"
+                % (len(issueArr), lastSync, len(otherRows)))
+        return issueArr, otherRows
+
+    def _probeRows(self, pool, rows, rowsByKey):
+        # Only fetch tickets changed since the last sync or not complete
+        fetchKeys = OrderedDict()
+        probeKeys = list()
+        for key, idxs in rowsByKey.items():
+            if any(not self._isComplete(rows[idx]) for idx in idxs):
+                fetchKeys[key] = idxs
+            else:
+                probeKeys.append(key)
+
+        for batchKeys, issueArr in self._searchBatches(pool, probeKeys,
+                'updated'):
+            if issueArr == None:
+                batchKeys = set(batchKeys)
+            else:
+                batchKeys = set(issue['key'] for issue in issueArr
+                        if any(self._isChanged(issue, rows[idx]['updated'])
+                            for idx in rowsByKey.get(issue['key'], list())))
+            for key in batchKeys:
+                fetchKeys[key] = rowsByKey[key]
+
+        debug("%d/%d tickets to fetch after probe" % (len(fetchKeys),
+            len(rowsByKey)))
+        return fetchKeys
+
+    def _isComplete(self, row):
+        for i in self._conf.jiraFields:
+            if not row[i] and i not in self._conf.jiraOptionalFields:
+                return False
+        for i in self._conf.dateFields:
+            if not isinstance(row[i], dateCSV):
+                return False
+        return True
+
+    def _searchBatches(self, pool, keys, fields, since=None):
+        # Yield (keys, issues) for each batch, issues is None on failure
+        batchSize = self._conf.jiraBatchSize
+        futures = dict()
+        for i in range(0, len(keys), batchSize):
+            batchKeys = keys[i:i+batchSize]
+            jql = self._BatchJQL % ','.join(batchKeys)
+            if since != None:
+                jql += self._SinceJQL % since
+            futures[pool.submit(self._searchPages, jql, fields)] = batchKeys
+
+        from concurrent.futures import as_completed
+        for future in as_completed(futures):
+            batchKeys = futures[future]
+            try:
+                issueArr = future.result()
+            except Exception as inst:
+                debug('JIRA request fail (keys="%s"): %s'
+                        % (','.join(batchKeys), inst))
+                if isinstance(inst, (circuitOpenError, OSError)):
+                    self.failedKeys.extend(batchKeys)
+                    continue
+                issueArr = None
+
+            yield batchKeys, issueArr
+
+    def _searchPages(self, jql, fields):
+        return list(self._iterPages(jql, fields))
+
+    def _iterPages(self, jql, fields):
+        page = self._request('search', jql, 0, self._conf.jiraPageSize, fields)
+        total = page.get('total', 0)
+        # Jira caps maxResults on the server side: the next pages are
+        # requested with the size of the first one
+        pageSize = len(page.get('issues', list()))
+        startAt = pageSize
+        pageStart = 0
+
+        # Next pages are requested ahead while the current one is consumed
+        futures = deque()
+        while page != None:
+            total = max(total, page.get('total', 0))
+            while (pageSize > 0 and len(futures) < self._conf.jiraWorkers
+                    and startAt < total):
+                futures.append((startAt, self._pages.submit(self._request,
+                    'search', jql, startAt, pageSize, fields)))
+                startAt += pageSize
+
+            issues = page.get('issues', list())
+            for issue in issues:
+                self._cache.putIssue(issue, fields)
+                yield issue
+
+            pageEnd = pageStart + len(issues)
+            nextStart = futures[0][0] if len(futures) > 0 else min(startAt,
+                    total)
+            page = None
+            if len(issues) > 0 and pageEnd < nextStart:
+                # Shorter page than requested: the missing issues first
+                pageStart = pageEnd
+                page = self._request('search', jql, pageEnd,
+                        nextStart - pageEnd, fields)
+            elif len(futures) > 0:
+                pageStart, future = futures.popleft()
+                page = future.result()
+
+    def _isChanged(self, issue, csvDate):
+        # CSV dates are truncated to the minute
+        jiraDate = dateCSV.fromJira(issue['fields'].get('updated'))
+        if not isinstance(jiraDate, dateCSV):
+            return True
+
+        date = jiraDate.date.replace(second=0, microsecond=0, tzinfo=None)
+        return date != csvDate.date.replace(tzinfo=None)
+
+    def _isNewer(self, issue, csvDate):
+        # Same check as _UpdatedJQL, done locally
+        jiraDate = dateCSV.fromJira(issue['fields'].get('updated'))
+        if not isinstance(jiraDate, dateCSV):
+            return True
+
+        # Dates from Jira and CSV are compared with their local time
+        date = csvDate.date + timedelta(0,60)
+        return jiraDate.date.replace(tzinfo=None) > date.replace(tzinfo=None)
+
+    def _updateDict(self, issue, dict2Up):
         fields = set(self._conf.jiraFields)
         fields.remove('key')
 
         for i in fields:
-            dict2Up[i] = getattr(jiraObj.fields, i)
+            value = issue['fields'].get(i)
+            # Jira objects (status, resolution...) are displayed by name
+            if isinstance(value, dict):
+                value = value.get('name', value.get('value'))
+            # Convert dates
+            if i in self._conf.dateFields:
+                value = dateCSV.fromJira(value)
+            dict2Up[i] = value
+
+class sheetManifest():
+    # Sheets of a directory (<sheetDir>/.sheets.manifest): key, mtime, size,
+    # content hash and parsed fields of each sheet file
+    fileName = '.sheets.manifest'
+    # Opened manifests by directory
+    _dirs = dict()
+    _path = None
+    _sheets = None
+    _dirty = False
+    _scanned = False
+
+    def open(sheetDir):
+        dirName = os.path.abspath(sheetDir)
+        if not dirName in sheetManifest._dirs:
+            sheetManifest._dirs[dirName] = sheetManifest(dirName)
+        return sheetManifest._dirs[dirName]
+
+    def saveAll():
+        for manifest in sheetManifest._dirs.values():
+            manifest.save()
+
+    def invalidateAll():
+        # The next scan checks the directories again
+        for manifest in sheetManifest._dirs.values():
+            manifest._scanned = False
+
+    def __init__(self, dirName):
+        self._path = os.path.join(dirName, self.fileName)
+        self._sheets = dict()
+        try:
+            with open(self._path) as fd:
+                self._sheets = json.load(fd).get('sheets', dict())
+        except FileNotFoundError:
+            pass
+        except Exception as inst:
+            debug("Ignore sheet manifest %s: %s" % (self._path, inst))
+
+    def lookup(self, name, stat):
+        # (True, fields) if the sheet is known and unchanged
+        entry = self._sheets.get(name)
+        if (entry == None or entry['mtime'] != stat.st_mtime_ns
+                or entry['size'] != stat.st_size):
+            return False, None
+        return True, sheetManifest._fields(entry)
+
+    def store(self, name, stat, dataSheet, digest=None):
+        # A sheet modified in the last seconds could change again without
+        # changing its mtime (coarse timestamps): it is checked again
+        mtime = stat.st_mtime_ns
+        if time.time() - stat.st_mtime <= 2:
+            mtime = None
+        self._sheets[name] = {
+                'key': name[:-3],
+                'mtime': mtime,
+                'size': stat.st_size,
+                'hash': digest,
+                'data': list(dataSheet.items()) if dataSheet else None,
+                }
+        self._dirty = True
+
+    def drop(self, name):
+        if self._sheets.pop(name, None):
+            self._dirty = True
+
+    def scan(self):
+        # Refresh the entries from one directory scan: only new or
+        # modified sheets are read
+        if self._scanned:
+            return True
+        dirName = os.path.dirname(self._path)
+        try:
+            entries = list(os.scandir(dirName))
+        except Exception as inst:
+            debug("Fail to scan %s: %s" % (dirName, inst))
+            return False
 
-        # Convert dates
-        for i in self._conf.dateFields:
-            dict2Up[i] = dateCSV.fromJira(dict2Up[i])
+        names = set()
+        for dirEntry in entries:
+            name = dirEntry.name
+            if name.startswith('.') or not name.endswith('.md'):
+                continue
+            try:
+                stat = dirEntry.stat()
+                names.add(name)
+                if self.lookup(name, stat)[0]:
+                    continue
+                with open(dirEntry.path, 'rb') as fd:
+                    content = fd.read()
+            except Exception as inst:
+                debug("Fail to read %s: %s" % (dirEntry.path, inst))
+                continue
+
+            digest = hashlib.sha1(content).hexdigest()
+            entry = self._sheets.get(name)
+            if entry != None and entry['hash'] == digest:
+                dataSheet = sheetManifest._fields(entry)
+            else:
+                try:
+                    lines = io.StringIO(content.decode(),
+                            newline=None).readlines()
+                except UnicodeDecodeError as inst:
+                    # Not a text sheet: its previous fields are dropped
+                    debug("Fail to read %s: %s" % (dirEntry.path, inst))
+                    names.discard(name)
+                    continue
+                dataSheet = sheetObj(None, name[:-3], dirEntry.path
+                        )._parseLines(lines)
+            self.store(name, stat, dataSheet, digest)
+
+        for name in set(self._sheets.keys()) - names:
+            self.drop(name)
+        self._scanned = True
+        return True
+
+    def has(self, key):
+        return key + '.md' in self._sheets
+
+    def sheets(self):
+        # (key, fields) of the parsed sheets
+        for entry in self._sheets.values():
+            if entry['data']:
+                yield entry['key'], OrderedDict(entry['data'])
+
+    def sheet(self, key):
+        entry = self._sheets.get(key + '.md')
+        return sheetManifest._fields(entry) if entry else None
+
+    def searchKeys(self, conditions, isOr=True):
+        foundKeys = set()
+        for entry in self._sheets.values():
+            data = entry['data'] and dict(entry['data'])
+            if not data:
+                continue
+            isKeyMatch = False
+            for k, v in conditions:
+                isKeyMatch = (k in data and data[k] == v)
+                if isOr == isKeyMatch:
+                    break
+            if isKeyMatch:
+                foundKeys.add(entry['key'])
+        return foundKeys
+
+    def save(self):
+        if not self._dirty:
+            return True
+        try:
+            fd = tempfile.NamedTemporaryFile(mode='w',
+                    dir=os.path.dirname(self._path),
+                    prefix=self.fileName + '.', delete=False)
+            with fd:
+                json.dump({'sheets': self._sheets}, fd)
+            os.chmod(fd.name, 0o644)
+            os.replace(fd.name, self._path)
+        except Exception as inst:
+            debug("Fail to save sheet manifest %s: %s" % (self._path, inst))
+            return False
+        self._dirty = False
+        return True
+
+    def _fields(entry):
+        if entry['data'] == None:
+            return None
+        return OrderedDict(entry['data'])
+
+class searchIndex():
+    # Inverted index of the words of some database columns and sheet fields
+    # (<database>.search): each field of a ticket is a document, ranked
+    # with BM25
+    ext = '.search'
+    _wordRe = re.compile(r'\w+')
+    _queryRe = re.compile(r'"([^"]*)"|(\S+)')
+    _k1 = 1.2
+    _b = 0.75
+    _db = None
+    _fields = None
+    _sheetFields = None
+
+    def __init__(self, path, fields, sheetFields):
+        self._fields = fields
+        self._sheetFields = sheetFields
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (name PRIMARY KEY, value);
+            CREATE TABLE IF NOT EXISTS items (source, key, digest,
+                PRIMARY KEY (source, key));
+            CREATE TABLE IF NOT EXISTS docs (doc INTEGER PRIMARY KEY,
+                source, key, field, length);
+            CREATE TABLE IF NOT EXISTS postings (term, doc, positions);
+            CREATE INDEX IF NOT EXISTS idx_item ON docs (source, key);
+            CREATE INDEX IF NOT EXISTS idx_term ON postings (term);
+            CREATE INDEX IF NOT EXISTS idx_doc ON postings (doc);
+            ''')
+
+    def open(path, conf, create=False):
+        if not create and not os.path.exists(path):
+            return None
+        try:
+            return searchIndex(path, conf.searchFields, conf.searchSheetFields)
+        except Exception as inst:
+            debug("Fail to open search index %s: %s" % (path, inst))
+            return None
+
+    def close(self):
+        self._db.close()
+
+    def version(self):
+        row = self._db.execute(
+                "SELECT value FROM meta WHERE name = 'version'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def setVersion(self, version):
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                (json.dumps(version),))
+
+    def updateRows(self, rows, complete=False):
+        # complete: rows holds the whole database
+        return self._updateItems('db', self._fields,
+                ((row['key'].strip(), row) for row in rows
+                    if row.get('key')), complete)
+
+    def updateSheets(self, manifest):
+        return self._updateItems('sheet', self._sheetFields,
+                manifest.sheets(), True)
+
+    def _updateItems(self, source, fields, items, complete):
+        # Only the items with modified fields are indexed again
+        db = self._db
+        digests = dict(db.execute('SELECT key, digest FROM items '
+            + 'WHERE source = ?', (source,)))
+        seen = set()
+        nbr = 0
+        db.execute('BEGIN')
+        try:
+            for key, data in items:
+                seen.add(key)
+                values = [str(data.get(f) or '') for f in fields]
+                digest = hashlib.sha1(json.dumps(values).encode()).hexdigest()
+                if digests.get(key) == digest:
+                    continue
+                self._remove(source, key)
+                self._add(source, key, zip(fields, values))
+                db.execute('INSERT INTO items VALUES (?, ?, ?)',
+                        (source, key, digest))
+                nbr += 1
+
+            if complete:
+                for key in set(digests.keys()) - seen:
+                    self._remove(source, key)
+                    nbr += 1
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return nbr
+
+    def _remove(self, source, key):
+        db = self._db
+        docs = [(doc,) for doc, in db.execute('SELECT doc FROM docs '
+            + 'WHERE source = ? AND key = ?', (source, key))]
+        db.executemany('DELETE FROM postings WHERE doc = ?', docs)
+        db.executemany('DELETE FROM docs WHERE doc = ?', docs)
+        db.execute('DELETE FROM items WHERE source = ? AND key = ?',
+                (source, key))
+
+    def _add(self, source, key, fieldValues):
+        db = self._db
+        for field, value in fieldValues:
+            words = searchIndex._words(value)
+            if len(words) <= 0:
+                continue
+            doc = db.execute('INSERT INTO docs (source, key, field, length) '
+                    + 'VALUES (?, ?, ?, ?)',
+                    (source, key, field, len(words))).lastrowid
+            positions = dict()
+            for pos, word in enumerate(words):
+                positions.setdefault(word, list()).append(str(pos))
+            db.executemany('INSERT INTO postings VALUES (?, ?, ?)',
+                    ((word, doc, ' '.join(posArr))
+                        for word, posArr in positions.items()))
+
+    def _words(text):
+        return [w.lower() for w in searchIndex._wordRe.findall(text)]
+
+    def search(self, query):
+        # [(key, score, fields)] of the tickets matching all the words and
+        # phrases of the query, best first
+        clauses = list()
+        for phrase, word in searchIndex._queryRe.findall(query):
+            words = searchIndex._words(phrase or word)
+            if len(words) > 0:
+                clauses.append(words)
+        if len(clauses) <= 0:
+            return list()
+
+        docNbr, avgLength = self._db.execute(
+                'SELECT count(*), avg(length) FROM docs').fetchone()
+        postings = dict()
+        for word in set(w for words in clauses for w in words):
+            postings[word] = {doc: (set(int(p) for p in pos.split()), key,
+                field, length) for doc, pos, key, field, length in
+                self._db.execute('SELECT p.doc, p.positions, d.key, d.field, '
+                    + 'd.length FROM postings p JOIN docs d ON d.doc = p.doc '
+                    + 'WHERE p.term = ?', (word,))}
+
+        keys = None
+        scores = dict()
+        fields = dict()
+        for words in clauses:
+            # Number of occurrences of the phrase in each document
+            matches = dict()
+            for doc, (positions, key, field, length) in postings[words[0]].items():
+                tf = len(positions)
+                for i, word in enumerate(words[1:], 1):
+                    if not doc in postings[word]:
+                        tf = 0
+                        break
+                    nextPos = postings[word][doc][0]
+                    positions = set(p for p in positions if p + i in nextPos)
+                    tf = len(positions)
+                if tf > 0:
+                    matches[doc] = (tf, key, field, length)
+
+            idf = math.log(1 + (docNbr - len(matches) + 0.5)
+                    / (len(matches) + 0.5))
+            clauseKeys = set()
+            for tf, key, field, length in matches.values():
+                norm = self._k1 * (1 - self._b + self._b * length / avgLength)
+                scores[key] = (scores.get(key, 0)
+                        + idf * tf * (self._k1 + 1) / (tf + norm))
+                fields.setdefault(key, set()).add(field)
+                clauseKeys.add(key)
+            keys = clauseKeys if keys == None else keys & clauseKeys
+
+        return sorted(((key, scores[key], sorted(fields[key])) for key in keys),
+                key=lambda res: (-res[1], res[0]))
 
 class sheetObj:
+    _headerRe = re.compile('^# ([A-Z]+-[0-9]+)[ ]*:[ ]*([^ ].*[^ ])[ ]* #$')
+    _fieldRe = re.compile('^## [ ]*([^ ]+)[ ]* ##$')
+    _commentRe = re.compile('^#([^#]*)')
+    _stopRe = re.compile('^#{1,2}([^#]+|$)')
     _fileTemp = None
     _fileRead = None
     _key = None
@@ -883,82 +4407,122 @@ class sheetObj:
         return self._writeData2Sheet(sheetData)
 
     def parse(self):
+        stat = self._stat()
+        manifest = None
+        name = os.path.basename(self._realName)
+        if stat != None:
+            manifest = sheetManifest.open(os.path.dirname(self._realName))
+            found, dataSheet = manifest.lookup(name, stat)
+            if found:
+                return dataSheet
+
+        self._fileRead.seek(0)
+        dataSheet = self._parseLines(self._fileRead.readlines())
+        if manifest != None:
+            manifest.store(name, stat, dataSheet)
+
+        return dataSheet
+
+    def _parseLines(self, lines):
         dataSheet = OrderedDict()
-        line = ""
-        nextLine = ""
         commentIdx = 0
-        key = ""
 
-        fileIn = self._fileRead
-        fileIn.seek(0)
-
-        for line in fileIn:
-            key, summary = self._parseHeader(line)
-            if key:
-                if key != self._key:
+        for pos, line in enumerate(lines):
+            search = sheetObj._headerRe.search(line)
+            if search:
+                if search.group(1) != self._key:
                     debug("Sheet key in header not matching")
-                dataSheet['key'] = key
-                dataSheet['summary'] = summary
+                dataSheet['key'] = search.group(1)
+                dataSheet['summary'] = search.group(2)
                 break
-
-        if not key:
+        else:
             debug("No header found in sheet")
             return None
 
-        try:
-            line = next(fileIn)
-        except StopIteration:
+        # Tokens: (line, comment, field name, is end of value)
+        tokens = [sheetObj._token(line) for line in lines[pos + 1:]]
+        if len(tokens) <= 0:
             debug("No fields in the sheet")
             return None
 
-        for nextLine in fileIn:
-            comment = self._parseComment(line)
-            if comment:
-                dataSheet['sheetComment%d' % commentIdx] = comment
+        emptyToken = sheetObj._token("")
+        token = tokens[0]
+        nextToken = emptyToken
+        idx = 1
+        while idx < len(tokens):
+            nextToken = tokens[idx]
+            idx += 1
+            if token[1]:
+                dataSheet['sheetComment%d' % commentIdx] = token[1]
                 commentIdx += 1
-            else:
-                field = self._parseField(line)
-                if field:
-                    value, line, nextLine = self._getValue(line, nextLine)
-                    dataSheet[field.lower()] = value
-
-            line = nextLine
+            elif token[2]:
+                # Value: lines until a blank line followed by a title
+                field = token[2]
+                val = list()
+                if not nextToken[0].startswith('#'):
+                    token = nextToken
+                    isStop = False
+                    while idx < len(tokens):
+                        nextToken = tokens[idx]
+                        idx += 1
+                        if nextToken[3] and token[0] == '\n':
+                            isStop = True
+                            break
+                        val.append(token[0])
+                        token = nextToken
+
+                    # Check if end of file
+                    if not isStop and token[0] != '\n':
+                        val.append(token[0])
+
+                val = ''.join(val)
+                if val and val[-1] == '\n':
+                    val = val[:-1]
+                dataSheet[field.lower()] = val
+            token = nextToken
 
         # Parse last line
-        comment = self._parseComment(nextLine)
-        if comment:
-            dataSheet['sheetComment%d' % commentIdx] = comment
-        else:
-            field = self._parseField(nextLine)
-            if field:
-                dataSheet[field] = ""
+        if nextToken[1]:
+            dataSheet['sheetComment%d' % commentIdx] = nextToken[1]
+        elif nextToken[2]:
+            dataSheet[nextToken[2]] = ""
 
         return dataSheet
 
     def __str__(self):
-        data = self.parse()
-        sheetStr = ""
+        return sheetObj.format(self.parse())
 
+    def format(data):
         if data is None:
-            return sheetStr
+            return ""
 
         # Header
-        sheetStr += "**[%s](%s)**: %s  \n" % (
+        parts = ["**[%s](%s)**: %s  \n" % (
                 data.pop('key', ""),
                 data.pop('jiraurl', ""),
                 data.pop('summary', ""),
-                )
+                )]
         # Fields
         for name, value in data.items():
-            sheetStr+= "**%s**: " % name.capitalize()
+            parts.append("**%s**: " % name.capitalize())
             if len(value) > 80 or value.find('\n') != -1:
-                sheetStr += ' \n'
-            sheetStr += str(value) + '  \n'
+                parts.append(' \n')
+            parts.append(str(value) + '  \n')
 
-        return sheetStr
+        return ''.join(parts)
+
+    def _stat(self):
+        # Only the sheets read from the sheet directory are cached
+        if self._fileRead.name != self._realName:
+            return None
+        try:
+            return os.fstat(self._fileRead.fileno())
+        except Exception:
+            return None
 
     def close(self):
-        self._fileRead.close()
+        if self._fileRead != None:
+            self._fileRead.close()
         if self._fileTemp != None:
             self._fileTemp.close()
 
@@ -969,6 +4533,8 @@ class sheetObj:
             self._fileRead.close()
             shutil.copyfile(self._fileTemp.name, self._realName)
             self._fileRead = open(self._realName)
+            sheetManifest.open(os.path.dirname(self._realName)).drop(
+                    os.path.basename(self._realName))
         except Exception as inst:
             debug("Failed to replace/create %s: %s" % (self._realName, inst))
             ret = False
@@ -995,59 +4561,19 @@ class sheetObj:
             return False
         return True
 
-    def _parseHeader(self, line):
-        p = re.compile('^# ([A-Z]+-[0-9]+)[ ]*:[ ]*([^ ].*[^ ])[ ]* #$')
-        key = ""
-        summary = ""
-
-        search = p.search(line)
+    def _token(line):
+        comment = ""
+        search = sheetObj._commentRe.match(line)
         if search:
-            key = search.group(1)
-            summary = search.group(2)
-
-        return key, summary
+            comment = search.group(1).strip(' ')
 
-    def _parseField(self, line):
-        pField = re.compile('^## [ ]*([^ ]+)[ ]* ##$')
         fieldName = ""
-
-        search = pField.search(line)
+        search = sheetObj._fieldRe.search(line)
         if search:
             fieldName = search.group(1)
 
-        return fieldName
-
-    def _parseComment(self, line):
-        pComment = re.compile('^#([^#]*)')
-        comment = ""
-
-        search = pComment.search(line)
-        if search:
-            comment = search.group(1).strip(' ')
-
-        return comment
-
-    def _getValue(self, line, nextLine):
-        pStop = re.compile('^#{1,2}([^#]+|$)')
-        val = ""
-        if not nextLine.startswith('#'):
-            line = nextLine
-            isStop = False
-            for nextLine in self._fileRead:
-                if pStop.match(nextLine) and line == '\n':
-                    isStop = True
-                    break
-                val += line
-                line = nextLine
-
-            # Check if end of file
-            if not isStop and line != '\n':
-                val += line
-
-        if val and val[-1] == '\n':
-            val = val[:-1]
-
-        return val, line, nextLine
+        return (line, comment, fieldName,
+                sheetObj._stopRe.match(line) != None)
 
     def _writeData2Sheet(self, data):
         ret = True
@@ -1080,6 +4606,7 @@ class sheetObj:
 if __name__ == "__main__":
     conf = config()
 
-    act = action(conf)
     args = parseArgs()
-    act.runAction(args)
+    if trackerDaemon.forward(args, sys.argv[1:]) == None:
+        act = action(conf)
+        act.runAction(args)
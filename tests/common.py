@@ -0,0 +1,180 @@
+# Load jira-tracker.py as a module (the file name is not a module name) and
+# serve fake Jira issues on a local port
+import importlib.util
+import json
+import os
+import re
+import threading
+import urllib.parse
+from datetime import datetime
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+rootDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def loadScript(name, path):
+    spec = importlib.util.spec_from_file_location(name,
+            os.path.join(rootDir, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+tracker = loadScript('jiraTracker', 'jira-tracker.py')
+
+def customConfig(**attrs):
+    # Config of jira-tracker.py with some values replaced
+    return type('customConfig', (tracker.config,), attrs)()
+
+def fakeConfig(url, **attrs):
+    # Config of jira-tracker.py for the fake Jira server
+    attrs.setdefault('jiraTransport', 'asyncio')
+    conf = customConfig(jiraURLRoot=url, **attrs)
+    tracker.conf = conf
+    return conf
+
+def jiraIssue(num, created, updated, status='Open'):
+    # Issue LU-<num> as returned by the Jira REST API
+    return {'id': str(10000 + num), 'key': 'LU-%d' % num,
+            'self': 'http://127.0.0.1/rest/api/2/issue/%d' % (10000 + num),
+            'fields': {
+                'summary': 'issue %d' % num,
+                'status': {'id': '1', 'name': status},
+                'resolution': None,
+                'created': created.strftime('%Y-%m-%dT%H:%M:%S.000+0000'),
+                'updated': updated.strftime('%Y-%m-%dT%H:%M:%S.000+0000'),
+                }}
+
+def jiraIssues(nbr, updatedNbr=0):
+    # nbr issues, one created per day, the first updatedNbr updated after
+    # jiraRows() dates
+    issues = dict()
+    start = datetime(2020, 1, 1, 10, 0)
+    for i in range(1, nbr + 1):
+        created = start + timedelta(days=i)
+        updated = created + timedelta(hours=1)
+        if i <= updatedNbr:
+            issues['LU-%d' % i] = jiraIssue(i, created,
+                    updated + timedelta(days=1), 'Reopened')
+        else:
+            issues['LU-%d' % i] = jiraIssue(i, created, updated)
+    return issues
+
+def jiraRows(issues):
+    # Rows followed in a database synchronized before the updates
+    rows = list()
+    for key, issue in issues.items():
+        fields = issue['fields']
+        created = fields['created'][:16].replace('T', ' ')
+        updated = datetime.strptime(created, '%Y-%m-%d %H:%M') \
+                + timedelta(hours=1)
+        rows.append({'key': key, 'summary': fields['summary'],
+            'status': 'Open', 'resolution': '',
+            'created': tracker.dateCSV.fromCsv(created),
+            'updated': tracker.dateCSV.fromCsv(
+                updated.strftime('%Y-%m-%d %H:%M')),
+            'interest': '1', 'trackstate': 'Follow', 'jiraurl': '',
+            'comment': ''})
+    return rows
+
+class fakeJira():
+    # Jira REST server: serverInfo, field, issue and search. A search
+    # returns the issues of its "key in (...)" or "key = ..." clause, all the
+    # issues without key clause
+    _keyRe = re.compile(r'key\s*=\s*"?([A-Z]+-\d+)"?')
+    _keyInRe = re.compile(r'key\s+in\s*\(([^)]*)\)')
+    issues = None
+    # Paths and parameters of the requests
+    requests = None
+    # Number of connections opened by the clients
+    connections = 0
+    # Close the connections after each response (idle keep-alive timeout)
+    closeIdle = False
+    # Max number of issues of a search page (0: maxResults of the request)
+    pageCap = 0
+    _server = None
+    _lock = None
+
+    def __init__(self, issues):
+        self.issues = issues
+        self.requests = list()
+        self._lock = threading.Lock()
+
+    def start(self):
+        handler = type('fakeJiraHandler', (fakeJiraHandler,), {'jira': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever,
+                daemon=True).start()
+        return 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, path):
+        # Number of requests on paths ending with path
+        with self._lock:
+            return len([r for r in self.requests if r[0].endswith(path)])
+
+    def search(self, jql):
+        keys = None
+        for search in self._keyRe.finditer(jql):
+            keys = [search.group(1)]
+        for search in self._keyInRe.finditer(jql):
+            keys = [k.strip().strip('"') for k in search.group(1).split(',')]
+        if keys == None:
+            return list(self.issues.values())
+        return [self.issues[k] for k in sorted(set(keys), key=keys.index)
+                if k in self.issues]
+
+class fakeJiraHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    jira = None
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.jira._lock:
+            self.jira.connections += 1
+
+    def _send(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        # Closed without "Connection: close", as by an idle timeout
+        self.close_connection = self.jira.closeIdle
+
+    def do_GET(self):
+        jira = self.jira
+        url = urllib.parse.urlparse(self.path)
+        query = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+        with jira._lock:
+            jira.requests.append((url.path, query))
+
+        if url.path.endswith('/serverInfo'):
+            return self._send(200, {'versionNumbers': [8, 5, 0],
+                'deploymentType': 'Server'})
+        if url.path.endswith('/field'):
+            return self._send(200, [{'id': f, 'clauseNames': [f]} for f in
+                ['summary', 'status', 'resolution', 'created', 'updated']])
+
+        if url.path.endswith('/search'):
+            issues = jira.search(query.get('jql', ''))
+            startAt = int(query.get('startAt', 0))
+            maxResults = int(query.get('maxResults', 50))
+            if jira.pageCap > 0:
+                maxResults = min(maxResults, jira.pageCap)
+            return self._send(200, {'startAt': startAt,
+                'maxResults': maxResults, 'total': len(issues),
+                'issues': issues[startAt:startAt + maxResults]})
+
+        search = re.search(r'/issue/([A-Z]+-\d+)$', url.path)
+        if search and search.group(1) in jira.issues:
+            return self._send(200, jira.issues[search.group(1)])
+        self._send(404, {'errorMessages': ['Issue does not exist']})
@@ -0,0 +1,87 @@
+# Commands and synchronizations run in memory by the serve daemon
+import contextlib
+import csv
+import gc
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import warnings
+
+from common import tracker, fakeConfig, fakeJira, jiraIssues, jiraRows
+
+class daemonTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.issues = jiraIssues(10, updatedNbr=2)
+        self.jira = fakeJira(self.issues)
+        self.conf = fakeConfig(self.jira.start(), jiraCacheTTL=0,
+                jiraRate=1000, jiraBurst=1000, jiraTimeout=5)
+
+        self.path = os.path.join(self.dir, 'db.csv')
+        with open(self.path, 'w', newline='') as fd:
+            csvOut = csv.DictWriter(fd, self.conf.jiraFields
+                    + self.conf.localFields, quoting=csv.QUOTE_NONNUMERIC)
+            csvOut.writeheader()
+            for row in jiraRows(self.issues):
+                csvOut.writerow({k: str(v) for k, v in row.items()})
+
+        self.args = tracker.parseArgs([self.path, 'serve', '-n', '-i', '0'])
+        self.args.inFile.close()
+        self.act = tracker.action(self.conf)
+        self.daemon = tracker.trackerDaemon(self.act, self.args)
+
+    def tearDown(self):
+        self.act._clean()
+        self.jira.stop()
+        shutil.rmtree(self.dir)
+
+    def test_syncClosesFiles(self):
+        # The first synchronization opens the pooled Jira connections
+        with contextlib.redirect_stderr(io.StringIO()), \
+                warnings.catch_warnings(record=True) as unclosed:
+            warnings.simplefilter('always', ResourceWarning)
+            self.assertTrue(self.daemon.sync())
+            fds = len(os.listdir('/proc/self/fd'))
+            for i in range(5):
+                self.assertTrue(self.daemon.sync())
+            gc.collect()
+        self.assertLessEqual(len(os.listdir('/proc/self/fd')), fds)
+        self.assertEqual([str(w.message) for w in unclosed
+            if issubclass(w.category, ResourceWarning)], [])
+
+    def test_commandOutput(self):
+        # The output of a command does not include the messages of the
+        # other threads, and the process streams are not replaced
+        runAction = self.act.runAction
+        def otherThread(args):
+            thread = threading.Thread(target=tracker.debug, args=['other'])
+            thread.start()
+            thread.join()
+            return runAction(args)
+        self.act.runAction = otherThread
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            response = self.daemon.runCommand(self.dir,
+                    ['db.csv', 'show', 'LU-1'])
+        self.assertTrue(response['status'], response)
+        self.assertIn('LU-1', response['stdout'])
+        self.assertNotIn('other', response['stderr'])
+        self.assertEqual(stderr.getvalue(), 'other\n')
+
+    def test_commandErrors(self):
+        # argparse help and errors are returned to the client
+        response = self.daemon.runCommand(self.dir, ['db.csv', 'show', '-h'])
+        self.assertTrue(response['status'])
+        self.assertIn('usage:', response['stdout'])
+
+        response = self.daemon.runCommand(self.dir,
+                ['db.csv', 'show', '--unknown'])
+        self.assertFalse(response['status'])
+        self.assertIn('unrecognized arguments', response['stderr'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# Retries, backoff and circuit breaker of the Jira requests, on the clock of
+# the tests: the delays are checked, not waited
+import threading
+import time
+import unittest
+
+from common import tracker, customConfig
+
+class fakeClock():
+    # monotonic() and sleep() of the scheduler: sleep moves the time
+    now = 1000.0
+    calls = 0
+    sleeps = None
+
+    def __init__(self):
+        self.sleeps = list()
+
+    def monotonic(self):
+        self.calls += 1
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+class fakeResponse():
+    headers = None
+
+    def __init__(self, headers):
+        self.headers = headers
+
+class fakeError(Exception):
+    # HTTP error of the jira module: status_code and response.headers
+    status_code = None
+    response = None
+
+    def __init__(self, status, headers=dict()):
+        super().__init__("HTTP %d" % status)
+        self.status_code = status
+        self.response = fakeResponse(headers)
+
+class fakeRequest():
+    # Raise the errors in order, then return the number of calls
+    errors = None
+    calls = 0
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+
+    def __call__(self):
+        self.calls += 1
+        if len(self.errors) > 0:
+            raise self.errors.pop(0)
+        return self.calls
+
+class schedulerTest(unittest.TestCase):
+    def _scheduler(self, **attrs):
+        attrs.setdefault('jiraRate', 1000)
+        attrs.setdefault('jiraBurst', 1000)
+        self.conf = customConfig(**attrs)
+        self.clock = fakeClock()
+        return tracker.requestScheduler(self.conf, self.clock.monotonic,
+                self.clock.sleep)
+
+    def test_retryAfter(self):
+        sched = self._scheduler()
+        request = fakeRequest(fakeError(429, {'Retry-After': '7'}))
+        self.assertEqual(sched.run(request), 2)
+        # Retry-After is longer than the backoff (jiraBackoff: 1s)
+        self.assertEqual(self.clock.sleeps, [7])
+
+    def test_backoff(self):
+        sched = self._scheduler(jiraRetries=3, jiraBackoff=2,
+                jiraMaxBackoff=5, jiraBreakerErrors=10)
+        request = fakeRequest(*[fakeError(503) for i in range(4)])
+        with self.assertRaises(fakeError):
+            sched.run(request)
+        self.assertEqual(request.calls, 4)
+
+        # Exponential, capped by jiraMaxBackoff, with a jitter of 50%
+        for delay, maxDelay in zip(self.clock.sleeps, [2, 4, 5]):
+            self.assertGreaterEqual(delay, maxDelay / 2)
+            self.assertLessEqual(delay, maxDelay)
+        self.assertEqual(len(self.clock.sleeps), 3)
+
+    def test_notRetried(self):
+        sched = self._scheduler()
+        request = fakeRequest(fakeError(404), ValueError("bad JSON"))
+        with self.assertRaises(fakeError):
+            sched.run(request)
+        with self.assertRaises(ValueError):
+            sched.run(request)
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(sched._failures, 0)
+
+    def test_timeoutsOpenCircuit(self):
+        sched = self._scheduler(jiraBreakerErrors=2, jiraBreakerDelay=60,
+                jiraBackoff=1)
+        request = fakeRequest(*[TimeoutError("timeout") for i in range(3)])
+        with self.assertRaises(tracker.circuitOpenError):
+            sched.run(request)
+        self.assertEqual(request.calls, 2)
+        with self.assertRaises(tracker.circuitOpenError):
+            sched.run(request)
+        self.assertEqual(request.calls, 2)
+
+        # Failed trial: suspended again for jiraBreakerDelay
+        self.clock.now += 60
+        with self.assertRaises(tracker.circuitOpenError):
+            sched.run(request)
+        self.assertEqual(request.calls, 3)
+        self.clock.now += 59
+        with self.assertRaises(tracker.circuitOpenError):
+            sched.run(request)
+
+        # Successful trial: closed
+        self.clock.now += 1
+        self.assertEqual(sched.run(request), 4)
+        self.assertEqual(sched._failures, 0)
+        self.assertFalse(sched._isTrial)
+        self.assertEqual(sched.run(request), 5)
+
+    def test_halfOpenTrialWaitsPause(self):
+        # The trial request of the half-open circuit waits for a Retry-After
+        # pause: it must still be admitted when the pause ends
+        sched = self._scheduler(jiraBreakerErrors=1, jiraBreakerDelay=60,
+                jiraRetries=0)
+        with self.assertRaises(fakeError):
+            sched.run(fakeRequest(fakeError(429, {'Retry-After': '100'})))
+        self.clock.now += 60
+
+        results = list()
+        trial = threading.Thread(target=lambda: results.append(
+            sched.run(fakeRequest())), daemon=True)
+        calls = self.clock.calls
+        trial.start()
+        while self.clock.calls == calls and trial.is_alive():
+            time.sleep(0.01)
+        # The trial read the clock under the lock: it now waits for the pause
+        with sched._cond:
+            self.clock.now += 40
+            sched._cond.notify_all()
+        trial.join(5)
+
+        self.assertEqual(results, [1])
+        self.assertEqual(sched._failures, 0)
+        self.assertFalse(sched._isTrial)
+
+    def test_concurrencyLimit(self):
+        sched = self._scheduler(jiraWorkers=8, jiraLatency=5, jiraRetries=0)
+        # Halved on failures
+        for i in range(2):
+            with self.assertRaises(fakeError):
+                sched.run(fakeRequest(fakeError(503)))
+        self.assertEqual(sched._limit, 2)
+
+        # Increased after a window of fast requests
+        for i in range(2):
+            sched.run(fakeRequest())
+        self.assertEqual(sched._limit, 3)
+
+        # Decreased by slow requests
+        sched = self._scheduler(jiraWorkers=8, jiraLatency=5)
+        def slowRequest():
+            self.clock.now += 10
+        sched.run(slowRequest)
+        self.assertEqual(sched._limit, 7)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# search command: BM25 ranking of the words and phrases of a query
+import contextlib
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from common import tracker, customConfig
+
+summaries = {
+        'LU-1': 'client eviction during recovery of the mds',
+        'LU-2': 'eviction of a client during recovery',
+        'LU-3': 'client eviction',
+        'LU-4': 'client eviction then client eviction again in recovery',
+        'LU-5': 'ost failover',
+        }
+
+class searchTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.conf = customConfig()
+        self.path = os.path.join(self.dir, 'db.csv')
+        with open(self.path, 'w', newline='') as fd:
+            csvOut = csv.DictWriter(fd, ['key', 'summary', 'comment',
+                'status', 'trackstate'], quoting=csv.QUOTE_NONNUMERIC)
+            csvOut.writeheader()
+            for key, summary in summaries.items():
+                csvOut.writerow({'key': key, 'summary': summary,
+                    'comment': '', 'status': 'Open', 'trackstate': 'Follow'})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _search(self, query):
+        index = tracker.searchIndex.open(os.path.join(self.dir, 'db.search'),
+                self.conf, create=True)
+        try:
+            index.updateRows([{'key': key, 'summary': summary, 'status': 'Open'}
+                for key, summary in summaries.items()], complete=True)
+            return [key for key, score, fields in index.search(query)]
+        finally:
+            index.close()
+
+    def test_phrase(self):
+        # The words of a phrase follow each other, in order
+        self.assertEqual(self._search('"client eviction"'),
+                ['LU-3', 'LU-4', 'LU-1'])
+        self.assertEqual(self._search('"eviction client"'), [])
+        self.assertEqual(self._search('"Eviction of a client"'), ['LU-2'])
+        self.assertEqual(sorted(self._search('client eviction')),
+                ['LU-1', 'LU-2', 'LU-3', 'LU-4'])
+
+        # All the clauses match: phrase and word
+        self.assertEqual(self._search('"client eviction" recovery'),
+                ['LU-4', 'LU-1'])
+        self.assertEqual(self._search('"client eviction" failover'), [])
+
+    def test_command(self):
+        args = tracker.parseArgs([self.path, 'search', '-i',
+            '"client eviction" Recovery'])
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), \
+                contextlib.redirect_stderr(io.StringIO()):
+            self.assertTrue(tracker.action(self.conf).runAction(args))
+        args.inFile.close()
+        self.assertEqual(out.getvalue(), 'LU-4 LU-1\n')
+        self.assertTrue(os.path.exists(self.path + '.search'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# show --sort: rows sorted in memory, or by runs spilled to temporary files
+import contextlib
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from common import tracker, customConfig
+
+fields = ['key', 'summary', 'status', 'created', 'updated', 'interest',
+        'trackstate', 'comment']
+
+class showTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'db.csv')
+        self.rows = [{'key': 'LU-%d' % i, 'summary': 'issue %d' % i,
+            'status': 'Open', 'created': '2020-01-01 10:00',
+            'updated': '2020-%02d-01 10:00' % (i % 12 + 1),
+            'interest': str(i * 7 % 5), 'trackstate': 'Follow',
+            'comment': 'line 1\nline "2", %d' % i if i % 4 == 0 else ''}
+            for i in range(1, 26)]
+        with open(self.path, 'w', newline='') as fd:
+            csvOut = csv.DictWriter(fd, fields, quoting=csv.QUOTE_NONNUMERIC)
+            csvOut.writeheader()
+            csvOut.writerows(self.rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _show(self, sortRows, *argv):
+        # Rows displayed and number of runs spilled
+        conf = customConfig(sortRows=sortRows)
+        args = tracker.parseArgs([self.path, 'show', '--all', '--csv']
+                + list(argv))
+        act = tracker.action(conf)
+        out = io.StringIO()
+        spillRows = tracker.action._spillRows
+        with unittest.mock.patch.object(tracker.action, '_spillRows',
+                autospec=True, side_effect=spillRows) as spilled, \
+                contextlib.redirect_stdout(out), \
+                contextlib.redirect_stderr(io.StringIO()):
+            self.assertTrue(act.runAction(args))
+        args.inFile.close()
+        # The output file is closed with the action
+        return list(csv.DictReader(io.StringIO(out.getvalue()))), \
+                spilled.call_count
+
+    def test_sortSpilled(self):
+        def order(row):
+            return (int(row['interest']), row['updated'],
+                    int(row['key'][3:]))
+        for argv in [['-s', 'interest,updated'],
+                ['-s', 'interest,updated', '-r']]:
+            expected = sorted(self.rows, key=order, reverse='-r' in argv)
+            inMemory, runs = self._show(1000, *argv)
+            self.assertEqual(runs, 0)
+            self.assertEqual(inMemory, expected)
+
+            # 6 runs of 4 rows in temporary files, the last one in memory
+            spilled, runs = self._show(4, *argv)
+            self.assertEqual(runs, 6)
+            self.assertEqual(spilled, expected)
+
+        # With a limit, only the first rows are kept
+        spilled, runs = self._show(4, '-s', 'interest,updated', '--limit', '3')
+        self.assertEqual(runs, 0)
+        self.assertEqual(spilled, sorted(self.rows, key=order)[:3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# CSV databases: journal of the changes and key index
+import contextlib
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from common import tracker
+
+fields = ['key', 'summary', 'status', 'resolution', 'created', 'updated',
+        'interest', 'trackstate', 'jiraurl', 'comment']
+
+def csvRows(nbr):
+    return [{'key': 'LU-%d' % i, 'summary': 'issue %d' % i,
+        'status': 'Open', 'resolution': '', 'created': '2020-01-01 10:00',
+        'updated': '2020-01-02 10:00', 'interest': '1', 'trackstate': 'Follow',
+        'jiraurl': '', 'comment': 'line 1\nline 2' if i % 3 == 0 else ''}
+        for i in range(1, nbr + 1)]
+
+class storageTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'db.csv')
+        self._write(csvRows(20))
+        self.stores = list()
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.dir)
+
+    def _write(self, rows):
+        with open(self.path, 'w', newline='') as fd:
+            csvOut = csv.DictWriter(fd, fields, quoting=csv.QUOTE_NONNUMERIC)
+            csvOut.writeheader()
+            csvOut.writerows(rows)
+
+    def _open(self, keyIndex=False):
+        store = tracker.dbStorage.open(open(self.path, 'r'), 1024 * 1024,
+                keyIndex)
+        self.stores.append(store)
+        return store
+
+    def _rows(self, keyIndex=False, keys=None):
+        # Rows by key, read by a new command
+        store = self._open(keyIndex)
+        rows = store.select(keys) if keys else store.rows()
+        return {row['key']: row for row in rows}
+
+    def test_journal(self):
+        with open(self.path, 'rb') as fd:
+            content = fd.read()
+        store = self._open()
+        self.assertEqual(store.modify({'LU-1': {'comment': 'a, "b"'},
+            'LU-99': {'comment': 'x'}}), set(['LU-99']))
+        store.modify({'LU-1': {'interest': 3}}, [dict(csvRows(21)[-1])])
+
+        # Journaled: the CSV file is not written
+        with open(self.path, 'rb') as fd:
+            self.assertEqual(fd.read(), content)
+        for keyIndex in [False, True]:
+            rows = self._rows(keyIndex)
+            self.assertEqual(rows['LU-1']['comment'], 'a, "b"')
+            self.assertEqual(rows['LU-1']['interest'], '3')
+            self.assertEqual(rows['LU-21']['summary'], 'issue 21')
+            self.assertEqual(rows['LU-3']['comment'], 'line 1\nline 2')
+            self.assertEqual(len(rows), 21)
+        self.assertEqual(list(self._rows(True, ['LU-1', 'LU-21'])),
+                ['LU-1', 'LU-21'])
+
+    def test_journalTruncated(self):
+        store = self._open()
+        store.modify({'LU-1': {'comment': 'first'}})
+        # Crash in the middle of the next entry
+        with open(self.path + '.journal', 'a') as fd:
+            fd.write('{"base": [1, 2], "changes": {"LU-2": {"comm')
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            rows = self._rows()
+            self._open().modify({'LU-3': {'comment': 'third'}})
+            rows3 = self._rows()
+        self.assertEqual(rows['LU-1']['comment'], 'first')
+        self.assertEqual(rows['LU-2']['comment'], '')
+        self.assertEqual(rows3['LU-1']['comment'], 'first')
+        self.assertEqual(rows3['LU-3']['comment'], 'third')
+        self.assertIn('Ignore truncated entry', stderr.getvalue())
+
+    def test_journalOutsideEdit(self):
+        store = self._open()
+        store.modify({'LU-1': {'comment': 'mine'}, 'LU-2': {'interest': '3'},
+            'LU-4': {'comment': 'removed'}},
+            [dict(csvRows(21)[-1], summary='mine')])
+        store.close()
+
+        # Rewritten by a spreadsheet: LU-1 comment and LU-2 summary modified,
+        # LU-4 removed, LU-21 added
+        rows = csvRows(21)
+        rows[0]['comment'] = 'theirs'
+        rows[1]['summary'] = 'edited'
+        rows[20]['summary'] = 'theirs'
+        del rows[3]
+        self._write(rows)
+
+        # Whole file, then rows read through the key index
+        for keyIndex, keys in [(False, None),
+                (True, ['LU-1', 'LU-2', 'LU-21'])]:
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                rows = self._rows(keyIndex, keys)
+            self.assertEqual(rows['LU-1']['comment'], 'theirs')
+            self.assertEqual(rows['LU-2']['interest'], '3')
+            self.assertEqual(rows['LU-2']['summary'], 'edited')
+            self.assertEqual(rows['LU-21']['summary'], 'theirs')
+            self.assertEqual(len(rows), len(keys or range(20)))
+            self.assertIn('LU-1 comment, LU-4 (removed), LU-21 (added)',
+                    stderr.getvalue())
+
+    def test_indexRebuilt(self):
+        buildIndex = tracker.csvStorage._buildIndex
+        with unittest.mock.patch.object(tracker.csvStorage, '_buildIndex',
+                autospec=True, side_effect=buildIndex) as built:
+            self.assertEqual(self._rows(True, ['LU-5'])['LU-5']['summary'],
+                    'issue 5')
+            self.assertTrue(os.path.exists(self.path + '.idx'))
+            self._rows(True, ['LU-5'])
+            self.assertEqual(built.call_count, 1)
+
+            # Same size, other content: outdated by the modification time
+            rows = csvRows(20)
+            rows[4]['summary'] = 'issux 5'
+            self._write(rows)
+            stat = os.stat(self.path)
+            os.utime(self.path, ns=(stat.st_atime_ns,
+                stat.st_mtime_ns + 10**9))
+            self.assertEqual(self._rows(True, ['LU-5'])['LU-5']['summary'],
+                    'issux 5')
+            self.assertEqual(built.call_count, 2)
+
+            # Rows moved: the new offsets are used
+            self._write(csvRows(20)[10:] + csvRows(10))
+            rows = self._rows(True, ['LU-5', 'LU-12'])
+            self.assertEqual(rows['LU-5']['summary'], 'issue 5')
+            self.assertEqual(rows['LU-12']['summary'], 'issue 12')
+            self._rows(True, ['LU-5'])
+            self.assertEqual(built.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+# Jira requests of the update through the transports, against a fake Jira
+# server on a local port
+import math
+import unittest
+import unittest.mock
+
+from common import tracker, fakeConfig, fakeJira, jiraIssues, jiraRows
+
+class transportTest(unittest.TestCase):
+    def setUp(self):
+        self.issues = jiraIssues(250, updatedNbr=30)
+        self.jira = fakeJira(self.issues)
+        self.url = self.jira.start()
+
+    def tearDown(self):
+        self.jira.stop()
+
+    def _update(self, **attrs):
+        attrs.setdefault('jiraBatchSize', 40)
+        attrs.setdefault('jiraPageSize', 7)
+        self.conf = fakeConfig(self.url, jiraRate=1000, jiraBurst=1000,
+                jiraTimeout=5, **attrs)
+        return tracker.jiraUpdate(self.conf)
+
+    def _searches(self):
+        return [q for path, q in self.jira.requests
+                if path.endswith('/search')]
+
+    def test_pagesInOrder(self):
+        update = self._update()
+        keys = ['LU-%d' % i for i in range(50, 0, -1)]
+        jql = update._BatchJQL % ','.join(keys)
+        issues = list(update._iterPages(jql, ','.join(self.conf.jiraFields)))
+
+        self.assertEqual([i['key'] for i in issues], keys)
+        self.assertEqual(sorted(int(q['startAt']) for q in self._searches()),
+                list(range(0, 50, 7)))
+
+    def test_batchedUpdate(self):
+        update = self._update()
+        rows = jiraRows(self.issues)
+        isUpdated = update.updateRows(rows)
+
+        # One "key in (...)" JQL per batch of keys, pages of jiraPageSize
+        keys = list(self.issues)
+        batches = [keys[i:i+40] for i in range(0, len(keys), 40)]
+        self.assertEqual(sorted(set(q['jql'] for q in self._searches())),
+                sorted(update._BatchJQL % ','.join(b) for b in batches))
+        self.assertEqual(len(self._searches()),
+                sum(math.ceil(len(b) / 7) for b in batches))
+        self.assertEqual(self.jira.count('/issue/LU-1'), 0)
+
+        # Only the rows updated on Jira are modified
+        self.assertEqual(isUpdated, [i < 30 for i in range(250)])
+        for row, rowIn in zip(rows, jiraRows(self.issues)):
+            if row['key'] in ['LU-%d' % i for i in range(1, 31)]:
+                update._updateDict(self.issues[row['key']], rowIn)
+                rowIn['trackstate'] = 'Updated'
+                self.assertEqual(rowIn['status'], 'Reopened')
+            self.assertEqual({k: str(v) for k, v in row.items()},
+                    {k: str(v) for k, v in rowIn.items()})
+
+    def test_pageSizeCapped(self):
+        # Jira returns at most 50 issues per page whatever maxResults
+        self.issues.update(jiraIssues(303, updatedNbr=30))
+        self.jira.pageCap = 50
+        update = self._update(jiraBatchSize=100, jiraPageSize=100)
+        fields = ','.join(self.conf.jiraFields)
+        issues = list(update._iterPages(update._CreatedJQL % '2020-01-01',
+            fields))
+        self.assertEqual([i['key'] for i in issues], list(self.issues))
+        self.assertEqual(sorted(int(q['maxResults']) for q in
+            self._searches()), [50] * 6 + [100])
+
+        rows = jiraRows(self.issues)
+        self.assertEqual(update.updateRows(rows),
+                [i < 30 for i in range(303)])
+
+        # Shorter page in the middle of the results
+        search = update._transport.search
+        def shortSearch(jql, startAt, maxResults, fields):
+            if startAt == 100:
+                maxResults = 20
+            return search(jql, startAt, maxResults, fields)
+        update._transport.search = shortSearch
+        issues = list(update._iterPages(update._CreatedJQL % '2020-01-01',
+            fields))
+        self.assertEqual([i['key'] for i in issues], list(self.issues))
+
+    def test_keepAlive(self):
+        self._update()
+        transport = tracker.asyncTransport(self.conf)
+        connections = self.jira.connections
+        for i in range(5):
+            self.assertEqual(transport.issue('LU-%d' % (i + 1),
+                'summary')['key'], 'LU-%d' % (i + 1))
+        self.assertEqual(self.jira.connections - connections, 1)
+
+        # Connections closed by the server while idle: the next requests are
+        # sent again on a new connection
+        self.jira.closeIdle = True
+        for i in range(3):
+            self.assertEqual(transport.serverInfo()['versionNumbers'],
+                    [8, 5, 0])
+        self.assertEqual(self.jira.connections - connections, 3)
+        self.assertEqual(self.jira.count('/serverInfo'), 3)
+
+    def test_transportFallback(self):
+        # Without --transport, the jira module: same rows as asyncio
+        for argv, transport in [([], None), (['--transport', 'asyncio'],
+                'asyncio')]:
+            with unittest.mock.patch('sys.argv', ['jira-tracker.py',
+                    '/dev/null', 'update'] + argv):
+                self.assertEqual(tracker.parseArgs().transport, transport)
+        self.assertEqual(tracker.config.jiraTransport, 'jira')
+
+        rows = dict()
+        for transport in ['jira', 'asyncio']:
+            update = self._update(jiraTransport=transport)
+            rows[transport] = jiraRows(self.issues)
+            update.updateRows(rows[transport])
+        self.assertEqual([{k: str(v) for k, v in row.items()}
+            for row in rows['jira']], [{k: str(v) for k, v in row.items()}
+                for row in rows['asyncio']])
+        self.assertEqual(sum(row['trackstate'] == 'Updated'
+            for row in rows['jira']), 30)
+
+if __name__ == '__main__':
+    unittest.main()
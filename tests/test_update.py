@@ -0,0 +1,62 @@
+# update command against the fake Jira server
+import contextlib
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from common import tracker, fakeConfig, fakeJira, jiraIssues, jiraRows
+
+class updateTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.issues = jiraIssues(30, updatedNbr=5)
+        self.jira = fakeJira(self.issues)
+        self.conf = fakeConfig(self.jira.start(), jiraCacheTTL=0,
+                jiraRate=1000, jiraBurst=1000, jiraTimeout=5)
+
+        self.path = os.path.join(self.dir, 'db.csv')
+        with open(self.path, 'w', newline='') as fd:
+            csvOut = csv.DictWriter(fd, self.conf.jiraFields
+                    + self.conf.localFields, quoting=csv.QUOTE_NONNUMERIC)
+            csvOut.writeheader()
+            for row in jiraRows(self.issues):
+                csvOut.writerow({k: str(v) for k, v in row.items()})
+
+    def tearDown(self):
+        self.jira.stop()
+        shutil.rmtree(self.dir)
+
+    def _run(self, *argv):
+        self.jira.requests = list()
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            args = tracker.parseArgs([self.path] + list(argv))
+            ret = tracker.action(self.conf).runAction(args)
+            args.inFile.close()
+        self.assertTrue(ret)
+        return [q['jql'] for path, q in self.jira.requests
+                if path.endswith('/search')]
+
+    def test_watermarkOfOutput(self):
+        # The state of the last sync describes the database written
+        outPath = os.path.join(self.dir, 'out.csv')
+        jqls = self._run('update', '-n', '-o', outPath)
+        self.assertTrue(os.path.exists(outPath + '.sync'))
+        self.assertFalse(os.path.exists(self.path + '.sync'))
+        self.assertFalse(any('updated >=' in jql for jql in jqls))
+
+        # Only the tickets updated since the last sync of out.csv
+        jqls = self._run('update', '-n', '-o', outPath)
+        self.assertGreater(len(jqls), 0)
+        self.assertTrue(all('updated >=' in jql for jql in jqls), jqls)
+        with open(outPath, newline='') as fd:
+            rows = list(csv.DictReader(fd))
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(sum(row['trackstate'] == 'Updated' for row in rows),
+                5)
+
+if __name__ == '__main__':
+    unittest.main()
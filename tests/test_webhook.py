@@ -0,0 +1,178 @@
+# serve --webhook: a daemon on a temporary database receives Jira webhooks
+# and the commands of the clients
+import contextlib
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from common import rootDir, tracker, jiraIssue, jiraIssues, jiraRows
+
+script = os.path.join(rootDir, 'jira-tracker.py')
+
+def createdIssue(num, created, priority='Major', versions=['Lustre 2.12.9']):
+    # New issue matching the news request of update
+    issue = jiraIssue(num, created, created)
+    issue['fields'].update({'issuetype': {'name': 'Bug'},
+        'priority': {'name': priority},
+        'project': {'key': 'LU', 'name': 'Lustre'},
+        'versions': [{'name': v} for v in versions]})
+    return issue
+
+class webhookTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.issues = jiraIssues(5)
+        self.path = os.path.join(self.dir, 'db.csv')
+        conf = tracker.config()
+        with open(self.path, 'w', newline='') as fd:
+            csvOut = csv.DictWriter(fd, conf.jiraFields + conf.localFields,
+                    quoting=csv.QUOTE_NONNUMERIC)
+            csvOut.writeheader()
+            for row in jiraRows(self.issues):
+                csvOut.writerow({k: str(v) for k, v in row.items()})
+
+        self.daemon = subprocess.Popen([sys.executable, script, 'db.csv',
+            'serve', '-i', '0', '--offline', '-w', '127.0.0.1:0'],
+            cwd=self.dir, stderr=subprocess.PIPE, text=True)
+        # The stderr of the daemon is read until it stops
+        self.log = list()
+        started = threading.Event()
+        def readLog():
+            for line in self.daemon.stderr:
+                self.log.append(line)
+                if line.startswith('Serve '):
+                    started.set()
+            started.set()
+        self.reader = threading.Thread(target=readLog, daemon=True)
+        self.reader.start()
+        started.wait(30)
+        port = [re.search(r'webhooks on 127\.0\.0\.1:(\d+)', line)
+                for line in self.log]
+        port = [match.group(1) for match in port if match]
+        self.assertTrue(port and os.path.exists(self.path + '.sock'),
+                ''.join(self.log))
+        self.url = 'http://127.0.0.1:%s/' % port[0]
+
+    def tearDown(self):
+        self.daemon.terminate()
+        self.daemon.wait(30)
+        self.reader.join(30)
+        shutil.rmtree(self.dir)
+
+    def _post(self, data):
+        if not isinstance(data, bytes):
+            data = json.dumps(data).encode()
+        request = urllib.request.Request(self.url, data=data,
+                headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.load(response)['result']
+        except urllib.error.HTTPError as inst:
+            return inst.code, json.load(inst)['result']
+
+    def _client(self, *argv):
+        proc = subprocess.run([sys.executable, script] + list(argv),
+                cwd=self.dir, capture_output=True, text=True, timeout=60)
+        return proc.stdout
+
+    def _rows(self):
+        rows = csv.DictReader(self._client('--no-daemon', 'db.csv', 'show',
+            '--all', '--csv').splitlines())
+        return {row['key']: row for row in rows}
+
+    def test_webhooks(self):
+        updated = jiraIssue(2, datetime(2020, 1, 3, 10, 0),
+                datetime(2020, 2, 1, 10, 0), 'Resolved')
+        self.assertEqual(self._post({'webhookEvent': 'jira:issue_updated',
+            'issue': updated}), (200, 'updated'))
+
+        created = createdIssue(10, datetime(2020, 3, 1, 10, 0))
+        self.assertEqual(self._post({'webhookEvent': 'jira:issue_created',
+            'issue': created}), (200, 'new'))
+
+        # Not matching the news request, or created before the last entry
+        minor = createdIssue(11, datetime(2020, 3, 2, 10, 0), 'Minor')
+        version = createdIssue(12, datetime(2020, 3, 2, 10, 0),
+                versions=['Lustre 2.15.0'])
+        old = createdIssue(13, datetime(2020, 1, 4, 10, 0))
+        for issue in [minor, version, old]:
+            self.assertEqual(self._post({'webhookEvent': 'jira:issue_created',
+                'issue': issue}), (200, 'ignored'), issue['key'])
+        self.assertEqual(self._post({'webhookEvent': 'jira:issue_deleted',
+            'issue': created}), (200, 'ignored'))
+        self.assertEqual(self._post({'webhookEvent': 'jira:issue_updated',
+            'issue': jiraIssue(20, datetime(2020, 1, 3), datetime(2020, 2, 1))
+            }), (200, 'ignored'))
+
+        # Malformed payloads
+        self.assertEqual(self._post(b'{"webhookEvent": '), (400, 'invalid'))
+        self.assertEqual(self._post([1, 2]), (400, 'invalid'))
+        self.assertEqual(self._post({'webhookEvent': 'jira:issue_updated',
+            'issue': {'key': 'LU-3'}}), (200, 'ignored'))
+
+        rows = self._rows()
+        self.assertEqual(sorted(rows), ['LU-1', 'LU-10', 'LU-2', 'LU-3',
+            'LU-4', 'LU-5'])
+        self.assertEqual(rows['LU-2']['status'], 'Resolved')
+        self.assertEqual(rows['LU-2']['trackstate'], 'Updated')
+        self.assertEqual(rows['LU-2']['updated'], '2020-02-01 10:00')
+        self.assertEqual(rows['LU-10']['trackstate'], 'New')
+        self.assertEqual(rows['LU-10']['created'], '2020-03-01 10:00')
+        self.assertEqual(rows['LU-3']['trackstate'], 'Follow')
+
+        # Each result is logged by the daemon
+        self.assertIn('Webhook jira:issue_created LU-10: new\n', self.log)
+        self.assertIn('Webhook jira:issue_created LU-11: ignored\n', self.log)
+
+    def _forward(self, *argv):
+        # Status and output of a command run by the daemon, None if the
+        # client has to run it
+        args = tracker.parseArgs(list(argv))
+        args.inFile.close()
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            status = tracker.trackerDaemon.forward(args, list(argv))
+        return status, out.getvalue()
+
+    def test_forward(self):
+        self.assertEqual(self._forward(self.path, 'modify', '-k', 'LU-1,LU-3',
+            'comment=Served')[0], True)
+        served = self._forward(self.path, 'show', '-i', '--filter',
+                'comment=Served')
+        self.assertEqual((served[0], served[1].split()), (True,
+            ['LU-1', 'LU-3']))
+        self.assertEqual(self._client('db.csv', 'show', '-i', '--filter',
+            'comment=Served'), served[1])
+
+        # --no-daemon: the command is run by the client, on the same database
+        self.assertEqual(self._forward('--no-daemon', self.path, 'show', '-i',
+            '--filter', 'comment=Served'), (None, ''))
+        self.assertEqual(self._client('--no-daemon', 'db.csv', 'show', '-i',
+            '--filter', 'comment=Served'), served[1])
+        self._client('--no-daemon', 'db.csv', 'modify', '-k', 'LU-4',
+                'comment=Direct')
+        direct = self._forward(self.path, 'show', '-i', '--filter',
+                'comment=Direct')
+        self.assertEqual((direct[0], direct[1].split()), (True, ['LU-4']))
+
+        # Daemon stopped: the socket is removed, the client runs the command
+        self.daemon.terminate()
+        self.daemon.wait(30)
+        self.assertFalse(os.path.exists(self.path + '.sock'))
+        self.assertEqual(self._forward(self.path, 'show', '-i', '--filter',
+            'comment=Served'), (None, ''))
+        self.assertEqual(self._client('db.csv', 'show', '-i', '--filter',
+            'comment=Served'), served[1])
+
+if __name__ == '__main__':
+    unittest.main()